@@ -1,17 +1,39 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
+from fastapi import FastAPI, File, Header, Query, UploadFile, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from typing import List, Optional
 import uuid
 import os
 import json
 from datetime import datetime
 import asyncio
+import logging
+import math
+import stat
+import time
 from pathlib import Path
 
-from .models import AnalysisResponse, AnalysisResult, ItemInfo, PriceRange, MarketResult
+from starlette.datastructures import UploadFile as StarletteUploadFile
+
+from .models import (
+    AnalysisResponse, AnalysisResult, ItemInfo, PriceRange, MarketResult,
+    BatchAnalysisResponse, BatchItem, BatchItemStatus, BatchStatusResponse
+)
 from .services.analysis_service import AnalysisService
-from .services.storage_service import StorageService
+from .services.storage_service import StorageService, ImageTooLargeError, MAX_IMAGE_SIZE
+from .services.analysis_store import create_analysis_store, decode_cursor, encode_cursor, history_key
+from .services.job_queue import AnalysisJobQueue, QueueFullError, PRIORITIES
+from .services.durable_queue import DurableJobQueue
+from .services.event_bus import AnalysisEventBus
+from .services.metrics import REGISTRY, STAGE_SECONDS
+from .services.response_cache import ResponseCache, etag_matches
+from .services.image_serving import ThumbnailCache, file_response
+from .services.retention import RetentionSweeper
+from .services.structured_logging import (
+    CorrelationIdMiddleware, analysis_id_var, payload, setup_logging
+)
+from search_cache import get_search_cache
+from upstream_replay import get_upstream_archive
 
 app = FastAPI(
     title="2nd Hand Price Checker API",
@@ -28,22 +50,120 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(CorrelationIdMiddleware)
+
+# Leveled logging, formatted and written off the event loop (LOG_LEVEL, LOG_FORMAT)
+setup_logging()
+logger = logging.getLogger(__name__)
+
 # Initialize services
 analysis_service = AnalysisService()
-storage_service = StorageService()
+storage_service = StorageService(
+    content_addressed=os.environ.get("CONTENT_ADDRESSED_STORAGE", "false").lower() == "true"
+)
+
+# Size variants for /uploads/...?size=N, generated on demand
+thumbnail_cache = ThumbnailCache(
+    cache_dir=os.environ.get("THUMBNAIL_CACHE_DIR", "uploads/thumbs"),
+    max_bytes=int(os.environ.get("THUMBNAIL_CACHE_MB", "256")) * 1024 * 1024,
+    sizes=tuple(int(size) for size in os.environ.get("THUMBNAIL_SIZES", "128,256,512,1024").split(",")),
+    image_format=os.environ.get("THUMBNAIL_FORMAT", "jpeg"),
+    quality=int(os.environ.get("THUMBNAIL_QUALITY", "80")),
+    workers=int(os.environ.get("THUMBNAIL_WORKERS", "2")),
+    # Thumbnails made while preprocessing are served instead of a duplicate
+    preprocessor=analysis_service.preprocessor
+)
+
+# Internal nginx location mapped to the uploads directory; when set,
+# nginx sends image bodies itself (sendfile) via X-Accel-Redirect
+IMAGE_ACCEL_REDIRECT = os.environ.get("IMAGE_ACCEL_REDIRECT", "").rstrip("/")
+
+# Persistent analysis records (SQLite by default, see ANALYSIS_STORE)
+analysis_store = create_analysis_store()
+
+# Status changes are pushed to SSE and WebSocket subscribers
+event_bus = AnalysisEventBus()
 
-# In-memory storage for demo (replace with database in production)
-analyses_db = {}
+# Completed analyses never change, so their JSON is serialized once and
+# served with a strong ETag; clients and CDNs may keep it
+result_responses = ResponseCache(
+    max_entries=int(os.environ.get("RESPONSE_CACHE_ENTRIES", "4096")),
+    max_bytes=int(os.environ.get("RESPONSE_CACHE_MB", "64")) * 1024 * 1024
+)
+COMPLETED_CACHE_CONTROL = os.environ.get("COMPLETED_CACHE_CONTROL", "public, max-age=86400, immutable")
+
+TERMINAL_STATUSES = ("completed", "error")
+
+# Analyses and their images are deleted this many hours after creation,
+# per status (0 keeps them forever); pending/processing ones were abandoned
+_stale_ttl = float(os.environ.get("RETENTION_STALE_HOURS", "48")) * 3600
+retention = RetentionSweeper(
+    analysis_store,
+    storage_service,
+    ttls={
+        "completed": float(os.environ.get("RETENTION_COMPLETED_HOURS", "720")) * 3600,
+        "error": float(os.environ.get("RETENTION_ERROR_HOURS", "24")) * 3600,
+        "pending": _stale_ttl,
+        "processing": _stale_ttl
+    },
+    batch_size=int(os.environ.get("RETENTION_BATCH_SIZE", "100")),
+    batch_interval=float(os.environ.get("RETENTION_BATCH_INTERVAL", "1.0")),
+    sweep_interval=float(os.environ.get("RETENTION_SWEEP_INTERVAL", "60")),
+    on_delete=lambda analysis_id: _forget_deleted(analysis_id),
+    # Only one worker process sweeps
+    lock_path=os.environ.get("RETENTION_LOCK_PATH", "data/retention.lock")
+)
+
+@app.on_event("startup")
+async def start_analysis_store():
+    await analysis_store.start()
+    await retention.start()
+
+@app.on_event("shutdown")
+async def close_analysis_store():
+    await retention.stop()
+    await analysis_store.close()
+
+# "inprocess" runs analyses on this event loop, "durable" hands them to worker.py processes
+ANALYSIS_EXECUTOR = os.environ.get("ANALYSIS_EXECUTOR", "inprocess").lower()
+MAX_QUEUE_DEPTH = int(os.environ.get("ANALYSIS_QUEUE_DEPTH", "100"))
+durable_queue = (
+    DurableJobQueue(os.environ.get("ANALYSIS_QUEUE_PATH", "data/jobs.db"))
+    if ANALYSIS_EXECUTOR == "durable" else None
+)
+_result_collector = None
+
+@app.on_event("startup")
+async def start_job_queue():
+    global _result_collector
+    if durable_queue is not None:
+        _result_collector = asyncio.create_task(collect_worker_results())
+    else:
+        await job_queue.start()
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    if _result_collector is not None:
+        _result_collector.cancel()
+    await job_queue.stop()
+    await analysis_service.close()
 
 @app.get("/")
 async def root():
     return {"message": "2nd Hand Price Checker API", "version": "1.0.0"}
 
+def _queue_full(retry_after: int) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Server is busy, please retry later",
+        headers={"Retry-After": str(retry_after)}
+    )
+
 @app.post("/api/analyze", response_model=AnalysisResponse)
 async def analyze_images(
-    background_tasks: BackgroundTasks,
     images: List[UploadFile] = File(...),
-    user_id: Optional[str] = None
+    user_id: Optional[str] = None,
+    priority: str = "interactive"
 ):
     """Upload images and start analysis process"""
     
@@ -51,62 +171,323 @@ async def analyze_images(
     if len(images) > 5:
         raise HTTPException(status_code=400, detail="Maximum 5 images allowed")
     
-    for image in images:
-        print(f"DEBUG: Received file - filename: {image.filename}, content_type: {image.content_type}")
-        if not image.content_type or not image.content_type.startswith('image/'):
-            print(f"DEBUG: Rejecting file with content_type: {image.content_type}")
-            raise HTTPException(status_code=400, detail="Only image files are allowed")
-        
-        # Check file size (10MB limit)
-        content = await image.read()
-        if len(content) > 10 * 1024 * 1024:
-            raise HTTPException(status_code=400, detail="Image size must be less than 10MB")
-        
-        # Reset file pointer
-        await image.seek(0)
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Priority must be one of: {', '.join(PRIORITIES)}")
+    
+    # Reject before touching the disk when we are already saturated
+    try:
+        await _check_capacity()
+    except QueueFullError as e:
+        raise _queue_full(e.retry_after)
+    
+    _validate_image_types(images)
     
     # Generate analysis ID
     analysis_id = str(uuid.uuid4())
     
-    # Save images
+    # Stream images to disk, enforcing the 10MB limit as data arrives
+    image_paths, image_hashes = await _save_images(analysis_id, images)
+    
+    # Initialize analysis record
+    record = _new_record(analysis_id, user_id, image_paths, image_hashes)
+    
+    # Near-duplicate of a recent photo: answer from the result cache
+    if await _complete_from_cache(record):
+        await _put_analysis(record, flush=True)
+        return AnalysisResponse(
+            analysis_id=analysis_id,
+            status="completed",
+            estimated_time=0
+        )
+    
+    # Persist before queueing so a worker never picks up an analysis the store doesn't know
+    await _put_analysis(record, flush=True)
+    
+    # Queue the analysis; estimated_time comes from queue position and observed service times
+    try:
+        estimated_time = await _submit_analysis(analysis_id, image_paths, image_hashes, priority)
+    except QueueFullError as e:
+        await analysis_store.delete(analysis_id)
+        await storage_service.delete_analysis_images(analysis_id)
+        raise _queue_full(e.retry_after)
+    logger.info("Analysis queued", extra={"analysis_id": analysis_id, "priority": priority})
+    
+    await analysis_store.update(analysis_id, {"estimated_time": estimated_time})
+    
+    return AnalysisResponse(
+        analysis_id=analysis_id,
+        status="processing",
+        estimated_time=estimated_time
+    )
+
+def _validate_image_types(images: List[UploadFile]):
+    for image in images:
+        logger.debug("Received file %s (%s)", image.filename, image.content_type)
+        if not image.content_type or not image.content_type.startswith('image/'):
+            logger.info("Rejecting file with content type %s", image.content_type)
+            raise HTTPException(status_code=400, detail="Only image files are allowed")
+
+async def _save_images(analysis_id: str, images: List[UploadFile]):
+    """Stream images to storage, returning (image_paths, image_hashes)"""
+    
     image_paths = []
+    image_hashes = []
     for i, image in enumerate(images):
-        content = await image.read()
-        file_path = await storage_service.save_image(analysis_id, f"image_{i}.jpg", content)
+        try:
+            with STAGE_SECONDS.time(stage="upload"):
+                file_path, content_hash, _ = await storage_service.save_upload(
+                    analysis_id, f"image_{i}.jpg", image, max_size=MAX_IMAGE_SIZE
+                )
+        except ImageTooLargeError:
+            await storage_service.delete_analysis_images(analysis_id)
+            raise HTTPException(status_code=400, detail="Image size must be less than 10MB")
         image_paths.append(file_path)
-    
-    # Initialize analysis record
-    analyses_db[analysis_id] = {
+        image_hashes.append(content_hash)
+    return image_paths, image_hashes
+
+def _new_record(analysis_id: str, user_id: Optional[str], image_paths: List[str], image_hashes: List[str]) -> dict:
+    return {
         "analysis_id": analysis_id,
         "user_id": user_id,
         "status": "pending",
         "image_paths": image_paths,
+        "image_hashes": image_hashes,
         "created_at": datetime.now().isoformat(),
-        "estimated_time": 30
+        "estimated_time": 0
     }
+
+async def _complete_from_cache(record: dict) -> bool:
+    """Fill a new record from the perceptual result cache, if it has a match
     
-    # Start background analysis
-    background_tasks.add_task(process_analysis, analysis_id, image_paths)
-    print(f"DEBUG: Background task added for analysis {analysis_id}")
+    Durable workers keep their own caches and look the images up there.
+    """
     
-    return AnalysisResponse(
-        analysis_id=analysis_id,
-        status="processing",
-        estimated_time=30
+    if durable_queue is not None:
+        return False
+    cached = await analysis_service.get_cached_result(record["image_paths"], record["image_hashes"])
+    if cached is None:
+        return False
+    record.update({
+        "status": "completed",
+        "item_info": cached["item_info"],
+        "price_range": cached["price_range"],
+        "confidence": cached["confidence"],
+        "market_data": cached["market_data"],
+        "image_quality": cached.get("image_quality"),
+        "preprocessing": cached.get("preprocessing"),
+        "completed_at": datetime.now().isoformat(),
+        "estimated_time": 0
+    })
+    return True
+
+# A batch is queued all at once, so it has to fit in the queue
+BATCH_MAX_ITEMS = min(int(os.environ.get("BATCH_MAX_ITEMS", "200")), MAX_QUEUE_DEPTH)
+BATCH_MAX_BYTES = int(os.environ.get("BATCH_MAX_BYTES", str(200 * 1024 * 1024)))
+
+@app.post("/api/analyze/batch", response_model=BatchAnalysisResponse)
+async def analyze_batch(request: Request, user_id: Optional[str] = None):
+    """Upload many items in one request and analyze them in the background
+    
+    Every multipart field name identifies one item: send 1-5 image files
+    under the same field name (for example ``item_0``, ``item_1``, ...).
+    Items run on the analysis queue in its batch lane; a batch the queue
+    has no room for is refused with 429.
+    """
+    
+    # Refuse oversized bodies before parsing them when the size is declared
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > BATCH_MAX_BYTES:
+        raise _batch_too_large()
+    
+    form = await request.form(max_files=BATCH_MAX_ITEMS * 5, max_fields=BATCH_MAX_ITEMS * 5)
+    try:
+        items = {}
+        for key, value in form.multi_items():
+            if isinstance(value, StarletteUploadFile):
+                items.setdefault(key, []).append(value)
+        
+        if not items:
+            raise HTTPException(status_code=400, detail="No items uploaded")
+        if len(items) > BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=400, detail=f"Maximum {BATCH_MAX_ITEMS} items per batch")
+        for key, images in items.items():
+            if len(images) > 5:
+                raise HTTPException(status_code=400, detail=f"Item {key}: maximum 5 images allowed")
+            _validate_image_types(images)
+        if sum(image.size or 0 for images in items.values() for image in images) > BATCH_MAX_BYTES:
+            raise _batch_too_large()
+        
+        try:
+            await _check_capacity(len(items))
+        except QueueFullError as e:
+            raise _queue_full(e.retry_after)
+        
+        batch_id = str(uuid.uuid4())
+        records = []
+        try:
+            for key, images in items.items():
+                analysis_id = str(uuid.uuid4())
+                image_paths, image_hashes = await _save_images(analysis_id, images)
+                record = _new_record(analysis_id, user_id, image_paths, image_hashes)
+                record["batch_id"] = batch_id
+                record["batch_item"] = key
+                records.append(record)
+        except HTTPException:
+            # All or nothing: drop the items saved so far
+            for record in records:
+                await storage_service.delete_analysis_images(record["analysis_id"])
+            raise
+    finally:
+        await form.close()
+    
+    # Items already seen are answered from the result cache
+    pending = [record for record in records if not await _complete_from_cache(record)]
+    try:
+        await _check_capacity(len(pending))
+    except QueueFullError as e:
+        for record in records:
+            await storage_service.delete_analysis_images(record["analysis_id"])
+        raise _queue_full(e.retry_after)
+    for record in records:
+        await _put_analysis(record)
+    # One commit for the whole batch, before any item ID is handed out
+    await analysis_store.flush()
+    
+    created_at = datetime.now().isoformat()
+    await analysis_store.put_batch({
+        "batch_id": batch_id,
+        "user_id": user_id,
+        "created_at": created_at,
+        "items": [{"item": r["batch_item"], "analysis_id": r["analysis_id"]} for r in records]
+    })
+    
+    await _schedule_batch(pending)
+    logger.info(
+        "Batch accepted", extra={"batch_id": batch_id, "items": len(records), "to_analyze": len(pending)}
+    )
+    
+    return BatchAnalysisResponse(
+        batch_id=batch_id,
+        status="completed" if not pending else "processing",
+        item_count=len(records),
+        items=[
+            BatchItem(item=r["batch_item"], analysis_id=r["analysis_id"], status=r["status"])
+            for r in records
+        ]
     )
 
+def _batch_too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Batch uploads are limited to {BATCH_MAX_BYTES // (1024 * 1024)}MB")
+
+async def _schedule_batch(records: List[dict]):
+    """Queue batch items in the batch lane, behind interactive analyses"""
+    
+    for position, record in enumerate(records):
+        try:
+            if durable_queue is not None:
+                await asyncio.to_thread(
+                    durable_queue.enqueue, record["analysis_id"],
+                    {"image_paths": record["image_paths"], "image_hashes": record["image_hashes"]},
+                    PRIORITIES["batch"]
+                )
+            else:
+                job_queue.submit(
+                    record["analysis_id"], record["image_paths"], record["image_hashes"], priority="batch"
+                )
+        except QueueFullError:
+            # Lost the room checked for up front to concurrent submissions
+            for unscheduled in records[position:]:
+                await _fail_analysis(unscheduled["analysis_id"], "Analysis queue is full, please retry later")
+            break
+
+@app.get("/api/batch/{batch_id}", response_model=BatchStatusResponse)
+async def get_batch_status(batch_id: str):
+    """Aggregated progress of a batch with per-item status"""
+    
+    batch = await analysis_store.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    counts = {}
+    items = []
+    for entry in batch["items"]:
+        analysis = await analysis_store.get(entry["analysis_id"])
+        status = analysis["status"] if analysis else "deleted"
+        counts[status] = counts.get(status, 0) + 1
+        items.append(BatchItemStatus(
+            item=entry["item"],
+            analysis_id=entry["analysis_id"],
+            status=status,
+            item_info=analysis.get("item_info") if analysis else None,
+            price_range=analysis.get("price_range") if analysis else None,
+            error_message=analysis.get("error_message") if analysis else None
+        ))
+    
+    finished = sum(counts.get(s, 0) for s in TERMINAL_STATUSES + ("deleted",))
+    return BatchStatusResponse(
+        batch_id=batch_id,
+        status="completed" if finished == len(items) else "processing",
+        created_at=batch["created_at"],
+        item_count=len(items),
+        counts=counts,
+        items=items
+    )
+
+MAX_LONG_POLL_WAIT = 60
+
 @app.get("/api/analysis/{analysis_id}", response_model=AnalysisResult)
-async def get_analysis(analysis_id: str):
-    """Get analysis results by ID"""
+async def get_analysis(
+    analysis_id: str,
+    response: Response,
+    wait: float = 0,
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get analysis results by ID
+    
+    With ``wait`` (seconds, up to 60) an unfinished analysis is held open
+    until its status changes or the wait expires, instead of returning
+    immediately. Completed results carry an ETag and are answered with
+    304 when the client already has them.
+    """
     
-    if analysis_id not in analyses_db:
+    cached = result_responses.get(analysis_id)
+    if cached is not None:
+        return _completed_response(*cached, if_none_match)
+    
+    analysis = await analysis_store.get(analysis_id)
+    if analysis is None:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    analysis = analyses_db[analysis_id]
-    print(f"DEBUG: Getting analysis {analysis_id}, current data: {analysis}")
+    if wait > 0 and analysis["status"] not in TERMINAL_STATUSES:
+        await event_bus.wait_for_change(analysis_id, min(wait, MAX_LONG_POLL_WAIT))
+        analysis = await analysis_store.get(analysis_id)
+        if analysis is None:
+            raise HTTPException(status_code=404, detail="Analysis not found")
     
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Returning %s analysis", analysis["status"],
+            extra={"analysis_id": analysis_id, "payload": payload(analysis)}
+        )
     if analysis["status"] == "completed":
-        result = AnalysisResult(
+        body, etag = result_responses.put(analysis_id, _to_result(analysis).model_dump_json().encode())
+        return _completed_response(body, etag, if_none_match)
+    
+    # Still changing: caches must revalidate every time
+    response.headers["Cache-Control"] = "no-cache"
+    return _to_result(analysis)
+
+def _completed_response(body: bytes, etag: str, if_none_match: Optional[str]) -> Response:
+    headers = {"ETag": etag, "Cache-Control": COMPLETED_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+def _to_result(analysis: dict) -> AnalysisResult:
+    """Build the public view of an analysis record"""
+    
+    if analysis["status"] == "completed":
+        return AnalysisResult(
             analysis_id=analysis["analysis_id"],
             status=analysis["status"],
             item_info=analysis.get("item_info"),
@@ -115,59 +496,233 @@ async def get_analysis(analysis_id: str):
             market_data=analysis.get("market_data", []),
             created_at=analysis["created_at"]
         )
-        print(f"DEBUG: Returning completed analysis: {result}")
-        return result
-    else:
-        result = AnalysisResult(
-            analysis_id=analysis["analysis_id"],
-            status=analysis["status"],
-            created_at=analysis["created_at"]
-        )
-        print(f"DEBUG: Returning processing analysis: {result}")
-        return result
+    return AnalysisResult(
+        analysis_id=analysis["analysis_id"],
+        status=analysis["status"],
+        created_at=analysis["created_at"]
+    )
+
+async def _put_analysis(record: dict, flush: bool = False):
+    """Store a new record; with ``flush`` it is committed before returning
+    
+    The client polls or subscribes as soon as it has the ID, and that
+    request may land on another worker, which only sees committed records.
+    """
+    with STAGE_SECONDS.time(stage="storage_write"):
+        await analysis_store.put(record)
+        if flush:
+            await analysis_store.flush()
+    retention.track(record)
+
+async def _update_analysis(analysis_id: str, fields: dict) -> Optional[dict]:
+    """Update an analysis record and push the new state to subscribers"""
+    
+    with STAGE_SECONDS.time(stage="storage_write"):
+        analysis = await analysis_store.update(analysis_id, fields)
+    if analysis is not None:
+        if "status" in fields:
+            retention.track(analysis)
+        message = _to_result(analysis).model_dump_json()
+        if analysis["status"] == "completed":
+            result_responses.put(analysis_id, message.encode())
+        event_bus.publish(analysis_id, message)
+    return analysis
+
+@app.get("/api/analysis/{analysis_id}/events")
+async def stream_analysis_events(analysis_id: str):
+    """Server-Sent Events stream of status changes, ending with the final result"""
+    
+    analysis = await analysis_store.get(analysis_id)
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    
+    async def events():
+        with event_bus.subscribe(analysis_id) as queue:
+            # Re-read after subscribing so no transition can slip in between
+            current = await analysis_store.get(analysis_id)
+            if current is None:
+                return
+            yield f"event: status\ndata: {_to_result(current).model_dump_json()}\n\n"
+            status = current["status"]
+            while status not in TERMINAL_STATUSES:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: status\ndata: {message}\n\n"
+                status = json.loads(message)["status"]
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/api/analysis/{analysis_id}/ws")
+async def analysis_websocket(websocket: WebSocket, analysis_id: str):
+    """WebSocket stream of status changes, closed after the final result"""
+    
+    await websocket.accept()
+    # Reading the socket is how a disconnect shows up while no events arrive
+    disconnected = asyncio.create_task(_wait_for_disconnect(websocket))
+    try:
+        with event_bus.subscribe(analysis_id) as queue:
+            current = await analysis_store.get(analysis_id)
+            if current is None:
+                await websocket.close(code=4404, reason="Analysis not found")
+                return
+            await websocket.send_text(_to_result(current).model_dump_json())
+            status = current["status"]
+            while status not in TERMINAL_STATUSES:
+                next_message = asyncio.ensure_future(queue.get())
+                await asyncio.wait({next_message, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_message.done():
+                    next_message.cancel()
+                    return
+                message = next_message.result()
+                await websocket.send_text(message)
+                status = json.loads(message)["status"]
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        disconnected.cancel()
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    """Return once the client goes away, ignoring anything it sends"""
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
 
 @app.get("/api/history/{user_id}")
-async def get_user_history(user_id: str, page: int = 1, limit: int = 20):
-    """Get user's analysis history"""
+async def get_user_history(
+    user_id: str,
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+):
+    """Get user's analysis history
     
-    user_analyses = [
-        analysis for analysis in analyses_db.values() 
-        if analysis.get("user_id") == user_id
-    ]
+    Pass the ``next_cursor`` of a previous response as ``cursor`` to page
+    by keyset instead of offset; deep pages then cost the same as page 1.
+    """
     
-    # Sort by creation date (newest first)
-    user_analyses.sort(key=lambda x: x["created_at"], reverse=True)
+    # Newest first, served from the (user_id, created_at) index.
+    # One extra row tells us whether there is a next page.
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        paginated_analyses = await analysis_store.list_by_user_after(user_id, after=after, limit=limit + 1)
+    else:
+        start = (page - 1) * limit
+        paginated_analyses = await analysis_store.list_by_user(user_id, offset=start, limit=limit + 1)
     
-    # Pagination
-    start = (page - 1) * limit
-    end = start + limit
-    paginated_analyses = user_analyses[start:end]
+    next_cursor = None
+    if len(paginated_analyses) > limit:
+        paginated_analyses = paginated_analyses[:limit]
+        next_cursor = encode_cursor(history_key(paginated_analyses[-1]))
     
     return {
         "analyses": paginated_analyses,
-        "total_count": len(user_analyses),
+        "total_count": await analysis_store.count_by_user(user_id),
         "page": page,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": next_cursor
     }
 
 @app.delete("/api/analysis/{analysis_id}")
 async def delete_analysis(analysis_id: str):
     """Delete an analysis"""
     
-    if analysis_id not in analyses_db:
+    analysis = await analysis_store.get(analysis_id)
+    if analysis is None:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    analysis = analyses_db[analysis_id]
-    
     # Clean up stored images
     for image_path in analysis.get("image_paths", []):
         await storage_service.delete_image(image_path)
     
     # Remove from database
-    del analyses_db[analysis_id]
+    await analysis_store.delete(analysis_id)
+    await _forget_deleted(analysis_id)
     
     return {"message": "Analysis deleted successfully"}
 
+async def _forget_deleted(analysis_id: str):
+    """Drop cached responses for a deleted analysis, here and in the other API processes"""
+    
+    result_responses.invalidate(analysis_id)
+    if durable_queue is not None:
+        # Other API processes drop their cached copies when they see this
+        await asyncio.to_thread(durable_queue.mark_deleted, analysis_id)
+
+def _resolve_upload(file_path: str):
+    """Path and stat of a stored file, refusing anything outside the uploads directory"""
+    
+    root = storage_service.base_path.resolve()
+    path = (root / file_path).resolve()
+    if root not in path.parents or path.name.endswith(".part"):
+        raise HTTPException(status_code=404, detail="Image not found")
+    try:
+        stat_result = path.stat()
+    except OSError:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise HTTPException(status_code=404, detail="Image not found")
+    return root, path, stat_result
+
+async def _upload_hash(path: Path) -> Optional[str]:
+    """SHA-256 of a stored upload, from its name or its analysis record"""
+    
+    if storage_service.blob_hash(path):
+        return path.stem
+    analysis = await analysis_store.get(path.parent.name)
+    if analysis is None:
+        return None
+    for image_path, image_hash in zip(analysis.get("image_paths", []), analysis.get("image_hashes", [])):
+        if Path(image_path).name == path.name:
+            return image_hash
+    return None
+
+@app.api_route("/uploads/{file_path:path}", methods=["GET", "HEAD"])
+async def serve_upload(file_path: str, request: Request, size: Optional[int] = None):
+    """Serve a stored image, or with ``size`` a thumbnail whose longest edge is at least that
+    
+    Supports Range and conditional requests; files never change, so they
+    are cacheable for a year.
+    """
+    
+    root, path, stat_result = _resolve_upload(file_path)
+    if size is not None:
+        if size <= 0:
+            raise HTTPException(status_code=400, detail="size must be positive")
+        content_hash = await _upload_hash(path)
+        # A variant evicted before it is served is a miss: make it again,
+        # and if it keeps disappearing serve the original
+        for _ in range(2):
+            try:
+                thumbnail = await thumbnail_cache.get(path, stat_result, size, content_hash)
+            except OSError as e:
+                logger.warning("Could not make thumbnail of %s: %s", file_path, e)
+                raise HTTPException(status_code=415, detail="Not a supported image")
+            try:
+                thumbnail_stat = thumbnail.stat()
+            except OSError:
+                continue
+            path, stat_result = thumbnail, thumbnail_stat
+            break
+    
+    accel_redirect = None
+    if IMAGE_ACCEL_REDIRECT and root in path.resolve().parents:
+        accel_redirect = f"{IMAGE_ACCEL_REDIRECT}/{path.resolve().relative_to(root).as_posix()}"
+    return file_response(
+        request.headers, path, stat_result,
+        send_body=request.method != "HEAD",
+        accel_redirect=accel_redirect
+    )
+
 @app.get("/api/test-analysis")
 async def test_analysis():
     """Test endpoint to verify analysis service works"""
@@ -180,52 +735,238 @@ async def test_analysis():
 @app.post("/api/complete-analysis/{analysis_id}")
 async def complete_analysis_manually(analysis_id: str):
     """Manually complete an analysis for testing"""
-    if analysis_id not in analyses_db:
+    analysis = await analysis_store.get(analysis_id)
+    if analysis is None:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
     try:
-        await process_analysis(analysis_id, analyses_db[analysis_id].get("image_paths", []))
+        await process_analysis(analysis_id, analysis.get("image_paths", []), analysis.get("image_hashes"))
         return {"success": True, "message": "Analysis completed"}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-async def process_analysis(analysis_id: str, image_paths: List[str]):
+async def _complete_analysis(analysis_id: str, result: dict):
+    """Store a finished analysis result"""
+    
+    analysis = await _update_analysis(analysis_id, {
+        "status": "completed",
+        "item_info": result["item_info"],
+        "price_range": result["price_range"],
+        "confidence": result["confidence"],
+        "market_data": result["market_data"],
+        "image_quality": result.get("image_quality"),
+        "preprocessing": result.get("preprocessing"),
+        "completed_at": datetime.now().isoformat()
+    })
+    logger.info("Analysis completed", extra={"analysis_id": analysis_id})
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Final analysis data", extra={"analysis_id": analysis_id, "payload": payload(analysis)})
+
+async def _fail_analysis(analysis_id: str, error_message: str):
+    """Mark an analysis as failed"""
+    
+    logger.warning("Analysis failed: %s", error_message, extra={"analysis_id": analysis_id})
+    await _update_analysis(analysis_id, {
+        "status": "error",
+        "error_message": error_message,
+        "completed_at": datetime.now().isoformat()
+    })
+
+async def process_analysis(analysis_id: str, image_paths: List[str], image_hashes: Optional[List[str]] = None):
     """Background task to process image analysis"""
     
+    # Every log line from this run carries the analysis ID
+    token = analysis_id_var.set(analysis_id)
     try:
-        print(f"DEBUG: Starting analysis for {analysis_id}")
-        # Update status to processing
-        analyses_db[analysis_id]["status"] = "processing"
-        print(f"DEBUG: Status updated to processing for {analysis_id}")
-        
-        # Simulate processing time
-        await asyncio.sleep(2)
-        print(f"DEBUG: Processing delay completed for {analysis_id}")
-        
-        # Use the analysis service to process images
-        result = await analysis_service.analyze_images(image_paths)
-        print(f"DEBUG: Analysis service returned: {result}")
-        
-        # Update analysis with results
-        analyses_db[analysis_id].update({
-            "status": "completed",
-            "item_info": result["item_info"],
-            "price_range": result["price_range"],
-            "confidence": result["confidence"],
-            "market_data": result["market_data"],
-            "completed_at": datetime.now().isoformat()
-        })
-        print(f"DEBUG: Analysis completed successfully for {analysis_id}")
-        print(f"DEBUG: Final analysis data: {analyses_db[analysis_id]}")
+        with STAGE_SECONDS.time(stage="pipeline"):
+            logger.debug("Starting analysis")
+            # Update status to processing
+            await _update_analysis(analysis_id, {"status": "processing"})
+            
+            # Use the analysis service to process images; the cache was checked on upload
+            result = await analysis_service.analyze_images(image_paths, image_hashes, use_cache=False)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Analysis service returned", extra={"payload": payload(result)})
+            
+            # Update analysis with results
+            await _complete_analysis(analysis_id, result)
         
     except Exception as e:
-        print(f"DEBUG: Analysis failed for {analysis_id}: {str(e)}")
         # Handle errors
-        analyses_db[analysis_id].update({
-            "status": "error",
-            "error_message": str(e),
-            "completed_at": datetime.now().isoformat()
-        })
+        await _fail_analysis(analysis_id, str(e))
+    finally:
+        analysis_id_var.reset(token)
+
+async def collect_worker_results(poll_interval: float = 0.2):
+    """Apply job state changes written by worker.py processes to the analysis store"""
+    
+    # Replay from the start so results finished while we were down are applied
+    last_seq = 0
+    last_purge = 0.0
+    while True:
+        changes = []
+        try:
+            changes = await asyncio.to_thread(durable_queue.changes_since, last_seq)
+            for change in changes:
+                await _apply_worker_change(change)
+                # Only move past a change once it is applied, so a failure retries it
+                last_seq = change["seq"]
+            
+            # Finished jobs are only needed until every API process has seen them
+            if time.monotonic() - last_purge > 3600:
+                last_purge = time.monotonic()
+                await asyncio.to_thread(durable_queue.purge_finished, 24 * 3600)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Could not collect worker results: %s", e)
+            changes = []
+        
+        if not changes:
+            await asyncio.sleep(poll_interval)
+
+async def _apply_worker_change(change: dict):
+    if change["status"] == "deleted":
+        analysis_store.evict(change["job_id"])
+        result_responses.invalidate(change["job_id"])
+        return
+    analysis = await analysis_store.get(change["job_id"])
+    if analysis is None or analysis["status"] in TERMINAL_STATUSES:
+        return
+    if change["status"] == "running":
+        await _update_analysis(change["job_id"], {"status": "processing"})
+    elif change["status"] == "done":
+        await _complete_analysis(change["job_id"], change["result"])
+    elif change["status"] == "failed":
+        await _fail_analysis(change["job_id"], change["error"] or "Analysis failed")
+
+async def _check_capacity(count: int = 1):
+    """Raise QueueFullError when ``count`` more analyses can't be queued"""
+    
+    if count <= 0:
+        return
+    if durable_queue is not None:
+        if await asyncio.to_thread(durable_queue.depth) + count > MAX_QUEUE_DEPTH:
+            raise QueueFullError(await asyncio.to_thread(durable_queue.retry_after))
+    elif job_queue.depth + count > job_queue.max_depth:
+        job_queue.rejected += 1
+        raise QueueFullError(job_queue.retry_after())
+
+async def _submit_analysis(analysis_id: str, image_paths: List[str], image_hashes: List[str], priority: str) -> int:
+    """Queue an analysis and return its estimated completion time in seconds"""
+    
+    if durable_queue is not None:
+        await _check_capacity()
+        await asyncio.to_thread(
+            durable_queue.enqueue, analysis_id,
+            {"image_paths": image_paths, "image_hashes": image_hashes}, PRIORITIES[priority]
+        )
+        return math.ceil(await asyncio.to_thread(durable_queue.estimate_wait))
+    return math.ceil(job_queue.submit(analysis_id, image_paths, image_hashes, priority=priority))
+
+# Analysis worker pool (defined after process_analysis, its handler)
+job_queue = AnalysisJobQueue(
+    process_analysis,
+    workers=int(os.environ.get("ANALYSIS_WORKERS", "4")),
+    max_depth=MAX_QUEUE_DEPTH
+)
+
+@app.get("/api/queue/stats")
+async def get_queue_stats():
+    """Queue depth, in-flight jobs and wait/service time metrics"""
+    if durable_queue is not None:
+        return {
+            "executor": "durable",
+            "depth": await asyncio.to_thread(durable_queue.depth),
+            "max_depth": MAX_QUEUE_DEPTH,
+            "estimated_wait": await asyncio.to_thread(durable_queue.estimate_wait)
+        }
+    return job_queue.stats()
+
+def _queue_samples():
+    if durable_queue is not None:
+        return [({"executor": "durable"}, durable_queue.depth())]
+    return [({"executor": "inprocess", "lane": lane}, depth) for lane, depth in job_queue.stats()["lanes"].items()]
+
+def _in_flight_samples():
+    if durable_queue is not None:
+        return []
+    return [({"executor": "inprocess"}, job_queue.in_flight)]
+
+def _cache_stats():
+    caches = {"result": analysis_service.result_cache.stats(), "response": result_responses.stats()}
+    thumbnails = thumbnail_cache.stats()
+    caches["thumbnail"] = {"hits": thumbnails["hits"], "misses": thumbnails["generated"]}
+    search_cache = get_search_cache()
+    if search_cache is not None:
+        caches["search"] = search_cache.stats()
+    if analysis_service.preprocessor is not None:
+        preprocess = analysis_service.preprocessor.stats()
+        caches["preprocess"] = {"hits": preprocess["cache_hits"], "misses": preprocess["processed"] + preprocess["failures"]}
+    # Coalesced calls are hits on the in-flight request
+    flight = analysis_service.single_flight.stats()
+    caches["single_flight"] = {"hits": flight["coalesced"], "misses": flight["calls"]}
+    return caches
+
+def _cache_samples(field: str):
+    samples = []
+    for cache, stats in _cache_stats().items():
+        if field == "ratio":
+            lookups = stats["hits"] + stats["misses"]
+            samples.append(({"cache": cache}, stats["hits"] / lookups if lookups else 0.0))
+        else:
+            samples.append(({"cache": cache}, stats[field]))
+    return samples
+
+def _llm_token_samples():
+    # Rendered on a thread while the loop may add models; copy the items first
+    return [
+        ({"model": model, "kind": kind}, usage[f"{kind}_tokens"])
+        for model, usage in list(analysis_service.llm.usage.items())
+        for kind in ("prompt", "completion")
+    ]
+
+REGISTRY.register_collector("analysis_queue_depth", "gauge", "Analyses waiting to run", _queue_samples)
+REGISTRY.register_collector("analysis_jobs_in_flight", "gauge", "Analyses currently running", _in_flight_samples)
+REGISTRY.register_collector("cache_hits_total", "counter", "Cache hits", lambda: _cache_samples("hits"))
+REGISTRY.register_collector("cache_misses_total", "counter", "Cache misses", lambda: _cache_samples("misses"))
+REGISTRY.register_collector("cache_hit_ratio", "gauge", "Cache hits over lookups", lambda: _cache_samples("ratio"))
+REGISTRY.register_collector("llm_tokens_total", "counter", "LLM tokens used per model", _llm_token_samples)
+REGISTRY.register_collector(
+    "retention_index_size", "gauge", "Analyses waiting to expire", lambda: [({}, retention.indexed())]
+)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics for this API process"""
+    # Rendered off the loop: collectors may read SQLite (durable queue depth)
+    body = await asyncio.to_thread(REGISTRY.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@app.get("/api/llm/stats")
+async def get_llm_stats():
+    """LLM concurrency limit, retries and token usage per model"""
+    return analysis_service.llm.stats()
+
+@app.get("/api/preprocess/stats")
+async def get_preprocess_stats():
+    """Images preprocessed by this process and the bytes saved"""
+    if analysis_service.preprocessor is None:
+        return {"enabled": False}
+    return {"enabled": True, **analysis_service.preprocessor.stats()}
+
+@app.get("/api/retention/stats")
+async def get_retention_stats():
+    """Retention TTLs, index size and what the sweeper has reclaimed"""
+    return retention.stats()
+
+@app.get("/api/upstream/stats")
+async def get_upstream_stats():
+    """Record/replay mode and archive hits, misses and recordings"""
+    archive = get_upstream_archive()
+    if archive is None:
+        return {"mode": "live"}
+    return {**archive.stats(), "archive": await asyncio.to_thread(archive.summary)}
 
 if __name__ == "__main__":
     import uvicorn
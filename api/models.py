@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 class ItemInfo(BaseModel):
@@ -40,4 +40,32 @@ class UserHistoryResponse(BaseModel):
     analyses: List[AnalysisResult]
     total_count: int
     page: int
-    limit: int
\ No newline at end of file
+    limit: int
+    next_cursor: Optional[str] = None
+
+class BatchItem(BaseModel):
+    item: str
+    analysis_id: str
+    status: str
+
+class BatchAnalysisResponse(BaseModel):
+    batch_id: str
+    status: str
+    item_count: int
+    items: List[BatchItem]
+
+class BatchItemStatus(BaseModel):
+    item: str
+    analysis_id: str
+    status: str
+    item_info: Optional[ItemInfo] = None
+    price_range: Optional[PriceRange] = None
+    error_message: Optional[str] = None
+
+class BatchStatusResponse(BaseModel):
+    batch_id: str
+    status: str
+    created_at: str
+    item_count: int
+    counts: Dict[str, int]
+    items: List[BatchItemStatus]
\ No newline at end of file
@@ -1,81 +1,309 @@
 import os
 import sys
+import re
+import json
+import logging
+import base64
 import asyncio
+import hashlib
 import tempfile
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
 from pathlib import Path
+import httpx
 from dotenv import load_dotenv
 
+from .http_clients import ArkClient, SerpApiClient
+from .image_preprocessor import ImagePreprocessor
+from .image_quality import compose_tiles, fuse_quality, score_image
+from .llm_gateway import LLMGateway
+from .metrics import STAGE_SECONDS
+from .price_extraction import extract_listing_price, extract_prices, price_statistics
+from .result_cache import PerceptualResultCache, dhash
+from .single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
 # Load environment variables from .env file
 load_dotenv()
 
 # Add the parent directory to sys.path to import smart_price_checker
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-try:
-    from smart_price_checker import (
-        analyze_image_with_llm,
-        perform_serpapi_search,
-        Ark
-    )
-except ImportError:
-    print("Warning: Could not import smart_price_checker module")
+from search_cache import normalize_query
+
+IDENTIFY_PROMPT = (
+    "Based on this image, identify the main item, its series, year of production and "
+    "visible condition. Respond with only a JSON object with the keys "
+    "\"name\", \"series\", \"year\" and \"condition\" "
+    "(condition is one of Excellent, Good, Fair, Poor)."
+)
+
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+
+# Listings returned to the client; pricing uses every search result
+MARKET_DATA_LIMIT = 5
+
+
+def _content_hash(image_path: str) -> str:
+    """SHA-256 of an image file, or of its path when it can't be read"""
+    digest = hashlib.sha256()
+    try:
+        with open(image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    except OSError:
+        return hashlib.sha256(image_path.encode()).hexdigest()
+    return digest.hexdigest()
+
+
+def _upload_result(shared: Dict[str, Any], quality: Optional[Dict[str, Any]], preprocessing) -> Dict[str, Any]:
+    """Add one upload's image quality and preprocessing to a result, scaling its confidence"""
+    result = dict(shared)
+    if quality is not None:
+        result["confidence"] = min(99.0, round(result["confidence"] * quality["confidence_factor"], 1))
+        result["image_quality"] = quality
+    if preprocessing is not None:
+        result["preprocessing"] = preprocessing
+    return result
+
+
+def _legacy_serpapi_search(query: str) -> List[Dict[str, Any]]:
+    """perform_serpapi_search from the CLI, imported on first use (it loads the search and Ark SDKs)"""
+    try:
+        from smart_price_checker import perform_serpapi_search
+    except ImportError:
+        logger.warning("Could not import smart_price_checker module")
+        return []
+    return perform_serpapi_search(query)
+
+class ItemIdentificationError(Exception):
+    """Raised when the vision model could not tell what the item is"""
 
 class AnalysisService:
     def __init__(self):
         self.model = "ep-20250731234418-8kgvb"
-        self.client = None
-        self._initialize_client()
+        
+        # Async clients with keep-alive pools, so network calls don't hold threads
+        self.serpapi = SerpApiClient()
+        self.ark = ArkClient()
+        
+        # Every LLM call goes through the gateway for rate limiting, retries and token accounting
+        self.llm = LLMGateway(
+            self.ark,
+            max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", "8")),
+            max_retries=int(os.environ.get("LLM_MAX_RETRIES", "4")),
+            deadline=float(os.environ.get("LLM_DEADLINE", "60")),
+        )
+        
+        # Near-duplicate photos reuse earlier results instead of re-running the pipeline
+        self.result_cache = PerceptualResultCache(
+            max_entries=int(os.environ.get("RESULT_CACHE_SIZE", "2048")),
+            ttl=float(os.environ.get("RESULT_CACHE_TTL", "3600")),
+            max_distance=int(os.environ.get("RESULT_CACHE_MAX_DISTANCE", "4")),
+        )
+        
+        # Concurrent identical searches and LLM calls share one upstream request
+        self.single_flight = SingleFlight()
+        
+        # With several photos, "best" sends the highest scoring frame to the LLM,
+        # "composite" a tiled image of all frames and "first" only the first photo
+        self.multi_image_mode = os.environ.get("MULTI_IMAGE_MODE", "best")
+        self.scoring_pool = ThreadPoolExecutor(
+            max_workers=int(os.environ.get("IMAGE_SCORING_WORKERS", "4")),
+            thread_name_prefix="image-scoring",
+        )
+        
+        # Uploads are downscaled and re-encoded before anything is sent to the LLM
+        self.preprocessor = None
+        if os.environ.get("PREPROCESS_ENABLED", "true").lower() == "true":
+            self.preprocessor = ImagePreprocessor(
+                cache_dir=os.environ.get("PREPROCESS_CACHE_DIR", "uploads/derived"),
+                max_edge=int(os.environ.get("PREPROCESS_MAX_EDGE", "1536")),
+                thumbnail_size=int(os.environ.get("PREPROCESS_THUMBNAIL_SIZE", "256")),
+                image_format=os.environ.get("PREPROCESS_FORMAT", "jpeg"),
+                quality=int(os.environ.get("PREPROCESS_QUALITY", "85")),
+                workers=int(os.environ.get("PREPROCESS_WORKERS", "4")),
+                max_bytes=int(os.environ.get("PREPROCESS_CACHE_MB", "1024")) * 1024 * 1024,
+            )
     
-    def _initialize_client(self):
-        """Initialize the Ark client"""
+    async def close(self):
+        """Close pooled HTTP connections"""
+        await self.serpapi.aclose()
+        await self.ark.aclose()
+    
+    async def _perceptual_hash(self, image_path: str) -> Optional[int]:
+        """Perceptual hash of an image, or None if it cannot be decoded"""
+        
         try:
-            self.client = Ark(
-                base_url="https://ark.ap-southeast.bytepluses.com/api/v3",
-                api_key=os.environ.get("ARK_API_KEY"),
-            )
-        except Exception as e:
-            print(f"Warning: Could not initialize Ark client: {e}")
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(None, dhash, image_path)
+        except Exception:
+            return None
+    
+    async def get_cached_result(self, image_paths: List[str], image_hashes: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Return a previous result for a near-identical primary image, if any"""
+        
+        if not image_paths:
+            return None
+        image_hash = await self._perceptual_hash(image_paths[0])
+        return await self._cached_result(image_hash, image_paths, image_hashes)
+    
+    async def _cached_result(self, image_hash: Optional[int], image_paths: List[str], image_hashes: Optional[List[str]]):
+        """Cached item, prices and listings, with image quality and preprocessing of these uploads"""
+        
+        if image_hash is None:
+            return None
+        cached = self.result_cache.get(image_hash)
+        if cached is None:
+            return None
+        _, preprocessing = await self._preprocess(image_paths, image_hashes)
+        quality = await self._image_quality(image_paths)
+        return _upload_result(cached, quality, preprocessing)
+    
+    async def _score_images(self, image_paths: List[str]) -> List[Dict[str, float]]:
+        """Score all images concurrently; undecodable images score zero"""
+        
+        loop = asyncio.get_event_loop()
+        scores = await asyncio.gather(
+            *(loop.run_in_executor(self.scoring_pool, score_image, path) for path in image_paths),
+            return_exceptions=True
+        )
+        return [
+            {"score": 0.0, "sharpness": 0.0, "exposure": 0.0, "resolution": 0.0, "width": 0, "height": 0}
+            if isinstance(score, Exception) else score
+            for score in scores
+        ]
+    
+    async def _preprocess(self, image_paths: List[str], image_hashes: List[str]):
+        """Return the LLM-ready version of each image and per-image savings"""
+        
+        if self.preprocessor is None:
+            return list(image_paths), None
+        reports = await self.preprocessor.process_many(image_paths, image_hashes)
+        # Fall back to the original when an image cannot be preprocessed
+        prepared = [report["path"] if report else path for path, report in zip(image_paths, reports)]
+        return prepared, reports
+    
+    async def _image_quality(self, image_paths: List[str]) -> Optional[Dict[str, Any]]:
+        """Fused quality of the photos, or None when only the first one is used"""
+        
+        if len(image_paths) < 2 or self.multi_image_mode == "first":
+            return None
+        
+        # Score the originals so resolution reflects what the user uploaded
+        scores = await self._score_images(image_paths)
+        quality = fuse_quality(scores)
+        quality["scores"] = scores
+        return quality
     
-    async def analyze_images(self, image_paths: List[str]) -> Dict[str, Any]:
-        """Analyze uploaded images and return price recommendations"""
+    async def _select_images(self, image_paths: List[str], prepared_paths: List[str]):
+        """Pick what the LLM sees: returns (image_path, source_paths, quality)"""
+        
+        quality = await self._image_quality(image_paths)
+        if quality is None:
+            return prepared_paths[0], image_paths[:1], None
+        scores = quality["scores"]
+        
+        if self.multi_image_mode != "composite":
+            best_index = quality["best_index"]
+            return prepared_paths[best_index], [image_paths[best_index]], quality
+        
+        # Best frames first so the top-left tile is the clearest view
+        ranked = sorted(range(len(image_paths)), key=lambda i: scores[i]["score"], reverse=True)
+        fd, composite_path = tempfile.mkstemp(suffix=".jpg", prefix="composite_")
+        os.close(fd)
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(
+            self.scoring_pool, compose_tiles, [prepared_paths[i] for i in ranked], composite_path
+        )
+        return composite_path, [image_paths[i] for i in ranked], quality
+    
+    async def analyze_images(
+        self, image_paths: List[str], image_hashes: Optional[List[str]] = None, use_cache: bool = True
+    ) -> Dict[str, Any]:
+        """Analyze uploaded images and return price recommendations
+        
+        ``image_hashes`` are the SHA-256 digests computed during upload;
+        they are recomputed from the files when not given. Pass
+        ``use_cache=False`` when the caller already looked the images up
+        with ``get_cached_result``.
+        """
         
         try:
-            # For demo purposes, we'll use the first image
-            # In production, you might want to analyze all images or select the best one
             primary_image_path = image_paths[0]
+            if image_hashes is None:
+                image_hashes = await asyncio.to_thread(lambda: [_content_hash(path) for path in image_paths])
+            content_hashes = dict(zip(image_paths, image_hashes))
+            
+            image_hash = await self._perceptual_hash(primary_image_path)
+            if use_cache:
+                cached = await self._cached_result(image_hash, image_paths, image_hashes)
+                if cached is not None:
+                    return cached
+            
+            # Rotate, strip, downscale and re-encode before anything goes to the LLM
+            with STAGE_SECONDS.time(stage="preprocess"):
+                prepared_paths, preprocessing = await self._preprocess(image_paths, image_hashes)
+            
+            # Score every photo and send only the best one (or a composite) to the LLM
+            with STAGE_SECONDS.time(stage="select"):
+                llm_image_path, source_paths, quality = await self._select_images(image_paths, prepared_paths)
             
             # Step 1: Generate keyword for search (uses intelligent mock data based on filename)
-            item_info = await self._identify_item(primary_image_path)
+            # Keyed on image content, so the same photos uploaded twice at once are identified once
+            try:
+                with STAGE_SECONDS.time(stage="identify"):
+                    item_info = await self.single_flight.do(
+                        ("identify",) + tuple(content_hashes[p] for p in source_paths),
+                        self._identify_item, llm_image_path
+                    )
+            finally:
+                if llm_image_path not in image_paths and llm_image_path not in prepared_paths:
+                    os.unlink(llm_image_path)
             
             # Step 2: Search for market data
             search_query = f"{item_info['name']} {item_info['series']} ราคา มือสอง"
-            market_data = await self._search_market_data(search_query)
+            with STAGE_SECONDS.time(stage="search"):
+                market_data = await self.single_flight.do(
+                    ("search", normalize_query(search_query)), self._search_market_data, search_query
+                )
             
             # Step 3: Analyze and suggest price
-            price_analysis = await self._analyze_price(primary_image_path, item_info, market_data)
+            with STAGE_SECONDS.time(stage="price"):
+                price_analysis = await self._analyze_price(source_paths[0], item_info, market_data)
             
-            return {
+            # Show listings with a price first, keeping search rank otherwise
+            listings = sorted(market_data, key=lambda item: item.get("price_value") is None)
+            
+            # What a near-duplicate photo can reuse; the image fields belong to this upload
+            shared = {
                 "item_info": item_info,
                 "price_range": price_analysis["price_range"],
                 "confidence": price_analysis["confidence"],
-                "market_data": market_data
+                "market_data": listings[:MARKET_DATA_LIMIT]
             }
+            # Canned listings stand in for a failed search; don't serve them again
+            if image_hash is not None and not any(item.get("mock") for item in market_data):
+                self.result_cache.put(image_hash, shared)
+            return _upload_result(shared, quality, preprocessing)
             
         except Exception as e:
-            print(f"Analysis error: {e}")
-            # Return mock data on error
-            return await self._mock_analysis()
+            # Callers record the failure (the durable worker retries it); keep the traceback here
+            logger.exception("Analysis error: %s", e)
+            raise
     
     async def _identify_item(self, image_path: str) -> Dict[str, str]:
-        """Use LLM to identify the item from image"""
+        """Use LLM to identify the item from image
+        
+        Raises ItemIdentificationError when the model call fails or gives
+        no usable answer.
+        """
         
         try:
-            # If ARK client is available, use actual AI analysis
-            if self.client and os.environ.get("ARK_API_KEY"):
-                # TODO: Implement actual image analysis with Ark client
-                # For now, return intelligent mock data based on filename
-                pass
+            # If an Ark API key is configured (or replaying), use actual AI analysis
+            if self.ark.enabled:
+                return await self._identify_with_llm(image_path)
             
             # Intelligent mock data based on image filename or path
             filename = Path(image_path).name.lower()
@@ -145,145 +373,80 @@ class AnalysisService:
                 return random.choice(item_types)
             
         except Exception as e:
-            print(f"Item identification error: {e}")
-            return {
-                "name": "Unknown Item",
-                "series": "Unknown",
-                "year": "Unknown",
-                "condition": "Unknown"
-            }
+            logger.warning("Item identification error: %s", e)
+            raise ItemIdentificationError(f"Could not identify the item: {e}") from e
+    
+    async def _identify_with_llm(self, image_path: str) -> Dict[str, str]:
+        """Ask the vision model what the item is"""
+        
+        image_url = await asyncio.to_thread(self._image_data_url, image_path)
+        response = await self.llm.complete(
+            self.model,
+            [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "image_url", "image_url": {"url": image_url}},
+                        {"type": "text", "text": IDENTIFY_PROMPT},
+                    ],
+                }
+            ],
+            max_tokens=200,
+        )
+        content = response["choices"][0]["message"]["content"]
+        match = _JSON_OBJECT.search(content)
+        if match is None:
+            raise ValueError(f"Unexpected identification response: {content[:200]}")
+        item = json.loads(match.group(0))
+        if not item.get("name"):
+            raise ValueError(f"Identification response names no item: {content[:200]}")
+        return {
+            key: str(item.get(key) or "Unknown")
+            for key in ("name", "series", "year", "condition")
+        }
+    
+    @staticmethod
+    def _image_data_url(image_path: str) -> str:
+        suffix = Path(image_path).suffix.lower()
+        mime = "image/webp" if suffix == ".webp" else "image/png" if suffix == ".png" else "image/jpeg"
+        with open(image_path, "rb") as f:
+            return f"data:{mime};base64,{base64.b64encode(f.read()).decode()}"
     
     async def _search_market_data(self, query: str) -> List[Dict[str, str]]:
         """Search for market data using SerpAPI"""
         
         try:
-            # Use the existing perform_serpapi_search function
-            loop = asyncio.get_event_loop()
-            search_results = await loop.run_in_executor(
-                None, perform_serpapi_search, query
-            )
+            if self.serpapi.enabled:
+                try:
+                    search_results = await self.serpapi.organic_results(query)
+                except httpx.HTTPError as e:
+                    logger.warning("Error performing SerpAPI search: %s", e)
+                    search_results = []
+            else:
+                # Without a key the CLI helper reports the problem and returns no results
+                loop = asyncio.get_event_loop()
+                search_results = await loop.run_in_executor(
+                    None, _legacy_serpapi_search, query
+                )
             
-            # Convert search results to market data format
+            # Convert search results to market data format, keeping all of them for pricing
             market_data = []
-            for result in search_results[:5]:  # Limit to 5 results
+            for result in search_results:
+                listing = extract_listing_price(result)
                 market_data.append({
                     "title": result.get("title", ""),
-                    "price": "Price not available",  # Extract price from title/snippet if possible
+                    "price": f"{listing[0]:,.0f} ฿" if listing else "Price not available",
                     "source": "Google Search",
-                    "url": result.get("link", "")
+                    "url": result.get("link", ""),
+                    "price_value": listing[0] if listing else None,
+                    "price_weight": listing[1] if listing else None
                 })
             
             return market_data
             
         except Exception as e:
-            print(f"Market search error: {e}")
-            # Return mock market data based on query content
-            if any(word in query.lower() for word in ['book', 'หนังสือ', 'textbook', 'manual']):
-                return [
-                    {
-                        "title": "Programming Book มือสอง สภาพดี",
-                        "price": "350 ฿",
-                        "source": "Facebook Marketplace",
-                        "url": "#"
-                    },
-                    {
-                        "title": "Technical Manual Second Hand",
-                        "price": "450 ฿",
-                        "source": "Shopee",
-                        "url": "#"
-                    },
-                    {
-                        "title": "Educational Book มือสอง",
-                        "price": "280 ฿",
-                        "source": "Lazada",
-                        "url": "#"
-                    }
-                ]
-            elif any(word in query.lower() for word in ['macbook', 'laptop', 'computer']):
-                return [
-                    {
-                        "title": "MacBook Pro มือสอง 13 inch",
-                        "price": "35,000 ฿",
-                        "source": "Facebook Marketplace",
-                        "url": "#"
-                    },
-                    {
-                        "title": "MacBook Pro Second Hand Good Condition",
-                        "price": "38,500 ฿",
-                        "source": "Shopee",
-                        "url": "#"
-                    },
-                    {
-                        "title": "MacBook Pro มือสอง สภาพดีมาก",
-                        "price": "32,800 ฿",
-                        "source": "Lazada",
-                        "url": "#"
-                    }
-                ]
-            elif any(word in query.lower() for word in ['watch', 'smartwatch', 'apple watch']):
-                return [
-                    {
-                        "title": "Apple Watch Series 7 มือสอง",
-                        "price": "8,500 ฿",
-                        "source": "Facebook Marketplace",
-                        "url": "#"
-                    },
-                    {
-                        "title": "Apple Watch มือสอง สภาพดี",
-                        "price": "9,200 ฿",
-                        "source": "Shopee",
-                        "url": "#"
-                    },
-                    {
-                        "title": "Apple Watch Series 7 Second Hand",
-                        "price": "7,800 ฿",
-                        "source": "Lazada",
-                        "url": "#"
-                    }
-                ]
-            elif any(word in query.lower() for word in ['camera', 'canon', 'nikon']):
-                return [
-                    {
-                        "title": "Canon EOS R5 มือสอง Body Only",
-                        "price": "85,000 ฿",
-                        "source": "Facebook Marketplace",
-                        "url": "#"
-                    },
-                    {
-                        "title": "Canon EOS R5 Second Hand Excellent",
-                        "price": "92,500 ฿",
-                        "source": "Shopee",
-                        "url": "#"
-                    },
-                    {
-                        "title": "Canon EOS R5 มือสอง สภาพดีมาก",
-                        "price": "88,800 ฿",
-                        "source": "Lazada",
-                        "url": "#"
-                    }
-                ]
-            else:
-                # Default to book data since user mentioned book input
-                return [
-                    {
-                        "title": "Educational Book มือสอง สภาพดี",
-                        "price": "350 ฿",
-                        "source": "Facebook Marketplace",
-                        "url": "#"
-                    },
-                    {
-                        "title": "Academic Book Second Hand",
-                        "price": "420 ฿",
-                        "source": "Shopee",
-                        "url": "#"
-                    },
-                    {
-                        "title": "Business Book มือสอง",
-                        "price": "280 ฿",
-                        "source": "Lazada",
-                        "url": "#"
-                    }
-                ]
+            logger.warning("Market search error: %s", e)
+            return [dict(listing, mock=True) for listing in _mock_market_data(query)]
     
     async def _analyze_price(self, image_path: str, item_info: Dict[str, str], market_data: List[Dict[str, str]]) -> Dict[str, Any]:
         """Analyze price based on image and market data"""
@@ -292,22 +455,23 @@ class AnalysisService:
             # Use the existing analyze_image_with_llm function
             # For demo, we'll return calculated price based on market data
             
-            # Extract prices from market data and calculate range
+            # Extract prices from market data and calculate an outlier-resistant range
             prices = []
+            weights = []
             for item in market_data:
-                price_str = item.get("price", "")
-                # Simple price extraction (in production, use more robust parsing)
-                if "฿" in price_str:
-                    try:
-                        price_num = float(price_str.replace("฿", "").replace(",", "").strip())
-                        prices.append(price_num)
-                    except:
-                        continue
+                price = item.get("price_value")
+                if price is None:
+                    parsed = extract_prices(item.get("price", ""))
+                    price = parsed[0] if parsed else None
+                if price is not None:
+                    prices.append(price)
+                    weights.append(item.get("price_weight") or 1.0)
             
-            if prices:
-                min_price = min(prices)
-                max_price = max(prices)
-                suggested_price = sum(prices) / len(prices)
+            stats = price_statistics(prices, weights)
+            if stats:
+                min_price = stats["min"]
+                max_price = stats["max"]
+                suggested_price = stats["suggested"]
                 confidence = 85  # Mock confidence score
             else:
                 # Default values if no prices found - use book pricing
@@ -327,7 +491,7 @@ class AnalysisService:
             }
             
         except Exception as e:
-            print(f"Price analysis error: {e}")
+            logger.warning("Price analysis error: %s", e)
             return {
                 "price_range": {
                     "min": 280,
@@ -337,42 +501,114 @@ class AnalysisService:
                 },
                 "confidence": 85
             }
+
+
+def _mock_market_data(query: str) -> List[Dict[str, str]]:
+    """Canned listings based on query content, for when the search fails"""
     
-    async def _mock_analysis(self) -> Dict[str, Any]:
-        """Return mock analysis data for demo purposes"""
-        # Default to book analysis since user mentioned book input
-        return {
-            "item_info": {
-                "name": "Educational Book",
-                "series": "Academic",
-                "year": "2023",
-                "condition": "Good"
+    if any(word in query.lower() for word in ['book', 'หนังสือ', 'textbook', 'manual']):
+        return [
+            {
+                "title": "Programming Book มือสอง สภาพดี",
+                "price": "350 ฿",
+                "source": "Facebook Marketplace",
+                "url": "#"
             },
-            "price_range": {
-                "min": 280,
-                "max": 450,
-                "currency": "THB",
-                "suggested": 365
+            {
+                "title": "Technical Manual Second Hand",
+                "price": "450 ฿",
+                "source": "Shopee",
+                "url": "#"
             },
-            "confidence": 85,
-            "market_data": [
-                {
-                    "title": "Programming Book มือสอง สภาพดี",
-                    "price": "350 ฿",
-                    "source": "Facebook Marketplace",
-                    "url": "#"
-                },
-                {
-                    "title": "Technical Manual Second Hand",
-                    "price": "450 ฿",
-                    "source": "Shopee",
-                    "url": "#"
-                },
-                {
-                    "title": "Educational Book มือสอง",
-                    "price": "280 ฿",
-                    "source": "Lazada",
-                    "url": "#"
-                }
-            ]
-        }
\ No newline at end of file
+            {
+                "title": "Educational Book มือสอง",
+                "price": "280 ฿",
+                "source": "Lazada",
+                "url": "#"
+            }
+        ]
+    elif any(word in query.lower() for word in ['macbook', 'laptop', 'computer']):
+        return [
+            {
+                "title": "MacBook Pro มือสอง 13 inch",
+                "price": "35,000 ฿",
+                "source": "Facebook Marketplace",
+                "url": "#"
+            },
+            {
+                "title": "MacBook Pro Second Hand Good Condition",
+                "price": "38,500 ฿",
+                "source": "Shopee",
+                "url": "#"
+            },
+            {
+                "title": "MacBook Pro มือสอง สภาพดีมาก",
+                "price": "32,800 ฿",
+                "source": "Lazada",
+                "url": "#"
+            }
+        ]
+    elif any(word in query.lower() for word in ['watch', 'smartwatch', 'apple watch']):
+        return [
+            {
+                "title": "Apple Watch Series 7 มือสอง",
+                "price": "8,500 ฿",
+                "source": "Facebook Marketplace",
+                "url": "#"
+            },
+            {
+                "title": "Apple Watch มือสอง สภาพดี",
+                "price": "9,200 ฿",
+                "source": "Shopee",
+                "url": "#"
+            },
+            {
+                "title": "Apple Watch Series 7 Second Hand",
+                "price": "7,800 ฿",
+                "source": "Lazada",
+                "url": "#"
+            }
+        ]
+    elif any(word in query.lower() for word in ['camera', 'canon', 'nikon']):
+        return [
+            {
+                "title": "Canon EOS R5 มือสอง Body Only",
+                "price": "85,000 ฿",
+                "source": "Facebook Marketplace",
+                "url": "#"
+            },
+            {
+                "title": "Canon EOS R5 Second Hand Excellent",
+                "price": "92,500 ฿",
+                "source": "Shopee",
+                "url": "#"
+            },
+            {
+                "title": "Canon EOS R5 มือสอง สภาพดีมาก",
+                "price": "88,800 ฿",
+                "source": "Lazada",
+                "url": "#"
+            }
+        ]
+    else:
+        # Default to book data since user mentioned book input
+        return [
+            {
+                "title": "Educational Book มือสอง สภาพดี",
+                "price": "350 ฿",
+                "source": "Facebook Marketplace",
+                "url": "#"
+            },
+            {
+                "title": "Academic Book Second Hand",
+                "price": "420 ฿",
+                "source": "Shopee",
+                "url": "#"
+            },
+            {
+                "title": "Business Book มือสอง",
+                "price": "280 ฿",
+                "source": "Lazada",
+                "url": "#"
+            }
+        ]
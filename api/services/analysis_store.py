@@ -0,0 +1,497 @@
+import os
+import json
+import base64
+import bisect
+import sqlite3
+import asyncio
+import threading
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Statuses after which an analysis record no longer changes
+TERMINAL_STATUSES = ("completed", "error")
+
+# (created_at, analysis_id) - the total order history pages are sorted by
+HistoryKey = Tuple[str, str]
+
+
+def history_key(record: Dict[str, Any]) -> HistoryKey:
+    return (record["created_at"], record["analysis_id"])
+
+
+def encode_cursor(key: HistoryKey) -> str:
+    """Turn a history position into an opaque, URL-safe cursor"""
+    raw = json.dumps(list(key), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> HistoryKey:
+    """Parse a cursor produced by encode_cursor, raising ValueError if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, analysis_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(created_at, str) or not isinstance(analysis_id, str):
+        raise ValueError("Invalid cursor")
+    return created_at, analysis_id
+
+
+class AnalysisStore:
+    """Base interface for analysis record storage
+
+    Records are plain dicts shaped like the ones the API returns from
+    the history endpoint. Every backend must keep ``analysis_id``,
+    ``user_id``, ``status`` and ``created_at`` queryable.
+    """
+
+    async def start(self) -> None:
+        """Start any background work the backend needs"""
+
+    async def close(self) -> None:
+        """Flush outstanding writes and release resources"""
+
+    async def flush(self) -> None:
+        """Make buffered writes visible to other processes now"""
+
+    async def get(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def put(self, record: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    async def update(self, analysis_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def delete(self, analysis_id: str) -> bool:
+        raise NotImplementedError
+
+    async def list_by_user(self, user_id: str, offset: int = 0, limit: int = 20) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def list_by_user_after(
+        self, user_id: str, after: Optional[HistoryKey] = None, limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """Return the next page, newest first, strictly older than ``after``"""
+        raise NotImplementedError
+
+    async def count_by_user(self, user_id: str) -> int:
+        raise NotImplementedError
+
+    async def put_batch(self, batch: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    async def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def delete_batch(self, batch_id: str) -> bool:
+        raise NotImplementedError
+
+    async def expiry_entries(self, created_after: Optional[str] = None) -> List[Tuple[str, str, str]]:
+        """(analysis_id, status, created_at) of every record, or of those created after ``created_after``"""
+        raise NotImplementedError
+
+    def evict(self, analysis_id: str) -> None:
+        """Drop any in-memory copy of a record another process deleted"""
+
+
+class MemoryAnalysisStore(AnalysisStore):
+    """Process-local store, useful for tests and throwaway demos"""
+
+    def __init__(self):
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._batches: Dict[str, Dict[str, Any]] = {}
+        # user_id -> history keys kept sorted oldest first
+        self._by_user: Dict[Optional[str], List[HistoryKey]] = {}
+
+    async def get(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        return self._records.get(analysis_id)
+
+    async def put(self, record: Dict[str, Any]) -> None:
+        analysis_id = record["analysis_id"]
+        if analysis_id in self._records:
+            await self.delete(analysis_id)
+        self._records[analysis_id] = record
+        bisect.insort(self._by_user.setdefault(record.get("user_id"), []), history_key(record))
+
+    async def update(self, analysis_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        record = self._records.get(analysis_id)
+        if record is None:
+            return None
+        record.update(fields)
+        return record
+
+    async def delete(self, analysis_id: str) -> bool:
+        record = self._records.pop(analysis_id, None)
+        if record is None:
+            return False
+        keys = self._by_user.get(record.get("user_id"), [])
+        key = history_key(record)
+        index = bisect.bisect_left(keys, key)
+        if index < len(keys) and keys[index] == key:
+            del keys[index]
+        return True
+
+    def _page(self, keys: List[HistoryKey], end: int, limit: int) -> List[Dict[str, Any]]:
+        end = max(end, 0)
+        start = max(end - limit, 0)
+        return [self._records[key[1]] for key in reversed(keys[start:end])]
+
+    async def list_by_user(self, user_id: str, offset: int = 0, limit: int = 20) -> List[Dict[str, Any]]:
+        keys = self._by_user.get(user_id, [])
+        return self._page(keys, len(keys) - offset, limit)
+
+    async def list_by_user_after(
+        self, user_id: str, after: Optional[HistoryKey] = None, limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        keys = self._by_user.get(user_id, [])
+        end = len(keys) if after is None else bisect.bisect_left(keys, after)
+        return self._page(keys, end, limit)
+
+    async def count_by_user(self, user_id: str) -> int:
+        return len(self._by_user.get(user_id, ()))
+
+    async def put_batch(self, batch: Dict[str, Any]) -> None:
+        self._batches[batch["batch_id"]] = batch
+
+    async def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        return self._batches.get(batch_id)
+
+    async def delete_batch(self, batch_id: str) -> bool:
+        return self._batches.pop(batch_id, None) is not None
+
+    async def expiry_entries(self, created_after: Optional[str] = None) -> List[Tuple[str, str, str]]:
+        return [
+            (key, record["status"], record["created_at"])
+            for key, record in self._records.items()
+            if created_after is None or record["created_at"] > created_after
+        ]
+
+
+class SQLiteAnalysisStore(AnalysisStore):
+    """Durable store backed by an embedded SQLite database in WAL mode
+
+    Writes are buffered and committed in batches, either once
+    ``batch_size`` changes are pending or every ``flush_interval``
+    seconds. Records this process is working on are pinned in memory so
+    status polls never hit the disk; finished records live in a small
+    LRU cache. In-flight records read from disk were written by another
+    process and are not cached, so polls keep seeing its progress.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "data/analyses.db",
+        batch_size: int = 256,
+        flush_interval: float = 0.5,
+        cache_size: int = 1024,
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.cache_size = cache_size
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._init_schema()
+
+        # In-flight records are pinned, finished ones are LRU cached
+        self._active: Dict[str, Dict[str, Any]] = {}
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+        # analysis_id -> record, or None for a pending delete
+        self._pending: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._flushing: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+
+    def _init_schema(self):
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS analyses (
+                    analysis_id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    status TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    data TEXT NOT NULL
+                );
+                DROP INDEX IF EXISTS idx_analyses_user_created;
+                CREATE INDEX IF NOT EXISTS idx_analyses_user_history
+                    ON analyses (user_id, created_at, analysis_id);
+                CREATE INDEX IF NOT EXISTS idx_analyses_status
+                    ON analyses (status);
+                CREATE INDEX IF NOT EXISTS idx_analyses_created
+                    ON analyses (created_at);
+                CREATE TABLE IF NOT EXISTS batches (
+                    batch_id TEXT PRIMARY KEY,
+                    created_at TEXT NOT NULL,
+                    data TEXT NOT NULL
+                );
+                """
+            )
+            self._conn.commit()
+
+    async def start(self) -> None:
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+        with self._lock:
+            self._conn.close()
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning("Could not flush analysis store: %s", e)
+
+    # Cache handling
+
+    def _remember(self, record: Dict[str, Any]):
+        analysis_id = record["analysis_id"]
+        if record.get("status") in TERMINAL_STATUSES:
+            self._active.pop(analysis_id, None)
+            self._cache[analysis_id] = record
+            self._cache.move_to_end(analysis_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.pop(analysis_id, None)
+            self._active[analysis_id] = record
+
+    def _forget(self, analysis_id: str):
+        self._active.pop(analysis_id, None)
+        self._cache.pop(analysis_id, None)
+
+    def evict(self, analysis_id: str) -> None:
+        self._forget(analysis_id)
+        # A buffered write would bring the deleted row back
+        self._pending.pop(analysis_id, None)
+
+    def _lookup_memory(self, analysis_id: str):
+        """Return (found, record) from memory without touching the disk"""
+        if analysis_id in self._active:
+            return True, self._active[analysis_id]
+        if analysis_id in self._cache:
+            self._cache.move_to_end(analysis_id)
+            return True, self._cache[analysis_id]
+        if analysis_id in self._pending:
+            return True, self._pending[analysis_id]
+        if analysis_id in self._flushing:
+            return True, self._flushing[analysis_id]
+        return False, None
+
+    # Writes
+
+    async def _stage(self, analysis_id: str, record: Optional[Dict[str, Any]]):
+        self._pending[analysis_id] = record
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Commit all buffered writes in a single transaction"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            self._flushing, self._pending = self._pending, {}
+            batch = self._flushing
+
+            # Serialize on the loop so the writer thread never sees a dict mid-update
+            upserts = []
+            deletes = []
+            for analysis_id, record in batch.items():
+                if record is None:
+                    deletes.append((analysis_id,))
+                else:
+                    upserts.append((
+                        analysis_id,
+                        record.get("user_id"),
+                        record.get("status"),
+                        record.get("created_at"),
+                        json.dumps(record),
+                    ))
+
+            try:
+                await asyncio.to_thread(self._write_batch, upserts, deletes)
+            except Exception:
+                # Keep the writes so the next flush can retry them
+                batch.update(self._pending)
+                self._pending = batch
+                raise
+            finally:
+                self._flushing = {}
+
+    def _write_batch(self, upserts: List[tuple], deletes: List[tuple]):
+        with self._lock:
+            with self._conn:
+                if upserts:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO analyses "
+                        "(analysis_id, user_id, status, created_at, data) VALUES (?, ?, ?, ?, ?)",
+                        upserts,
+                    )
+                if deletes:
+                    self._conn.executemany(
+                        "DELETE FROM analyses WHERE analysis_id = ?", deletes
+                    )
+
+    async def put(self, record: Dict[str, Any]) -> None:
+        self._remember(record)
+        await self._stage(record["analysis_id"], record)
+
+    async def update(self, analysis_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        record = await self.get(analysis_id)
+        if record is None:
+            return None
+        record.update(fields)
+        self._remember(record)
+        await self._stage(analysis_id, record)
+        return record
+
+    async def delete(self, analysis_id: str) -> bool:
+        if await self.get(analysis_id) is None:
+            return False
+        self._forget(analysis_id)
+        await self._stage(analysis_id, None)
+        return True
+
+    # Reads
+
+    async def get(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        found, record = self._lookup_memory(analysis_id)
+        if found:
+            return record
+        record = await asyncio.to_thread(self._read_one, analysis_id)
+        if record is not None and record.get("status") in TERMINAL_STATUSES:
+            self._remember(record)
+        return record
+
+    def _read_one(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM analyses WHERE analysis_id = ?", (analysis_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def list_by_user(self, user_id: str, offset: int = 0, limit: int = 20) -> List[Dict[str, Any]]:
+        await self.flush()
+        records = await asyncio.to_thread(self._read_user_page, user_id, offset, limit)
+        # Prefer in-memory copies so callers see the same objects as polls
+        return [self._lookup_memory(r["analysis_id"])[1] or r for r in records]
+
+    def _read_user_page(self, user_id: str, offset: int, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM analyses WHERE user_id = ? "
+                "ORDER BY created_at DESC, analysis_id DESC LIMIT ? OFFSET ?",
+                (user_id, limit, offset),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    async def list_by_user_after(
+        self, user_id: str, after: Optional[HistoryKey] = None, limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        if after is None:
+            return await self.list_by_user(user_id, offset=0, limit=limit)
+        await self.flush()
+        records = await asyncio.to_thread(self._read_user_page_after, user_id, after, limit)
+        return [self._lookup_memory(r["analysis_id"])[1] or r for r in records]
+
+    def _read_user_page_after(self, user_id: str, after: HistoryKey, limit: int) -> List[Dict[str, Any]]:
+        # Keyset seek on the (user_id, created_at, analysis_id) index
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM analyses WHERE user_id = ? "
+                "AND (created_at, analysis_id) < (?, ?) "
+                "ORDER BY created_at DESC, analysis_id DESC LIMIT ?",
+                (user_id, after[0], after[1], limit),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    async def count_by_user(self, user_id: str) -> int:
+        await self.flush()
+        return await asyncio.to_thread(self._count_user, user_id)
+
+    def _count_user(self, user_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM analyses WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return row[0]
+
+    # Batches are written rarely, so they skip the write buffer
+
+    async def put_batch(self, batch: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._write_batch_record, batch["batch_id"], batch["created_at"], json.dumps(batch))
+
+    def _write_batch_record(self, batch_id: str, created_at: str, data: str):
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO batches (batch_id, created_at, data) VALUES (?, ?, ?)",
+                    (batch_id, created_at, data),
+                )
+
+    async def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._read_batch_record, batch_id)
+
+    def _read_batch_record(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM batches WHERE batch_id = ?", (batch_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def delete_batch(self, batch_id: str) -> bool:
+        return await asyncio.to_thread(self._delete_batch_record, batch_id)
+
+    def _delete_batch_record(self, batch_id: str) -> bool:
+        with self._lock:
+            with self._conn:
+                return self._conn.execute("DELETE FROM batches WHERE batch_id = ?", (batch_id,)).rowcount > 0
+
+    async def expiry_entries(self, created_after: Optional[str] = None) -> List[Tuple[str, str, str]]:
+        await self.flush()
+        return await asyncio.to_thread(self._read_expiry_entries, created_after)
+
+    def _read_expiry_entries(self, created_after: Optional[str]) -> List[Tuple[str, str, str]]:
+        with self._lock:
+            if created_after is None:
+                return self._conn.execute("SELECT analysis_id, status, created_at FROM analyses").fetchall()
+            return self._conn.execute(
+                "SELECT analysis_id, status, created_at FROM analyses WHERE created_at > ?", (created_after,)
+            ).fetchall()
+
+
+def create_analysis_store() -> AnalysisStore:
+    """Build the store selected by the ANALYSIS_STORE environment variable"""
+
+    backend = os.environ.get("ANALYSIS_STORE", "sqlite").lower()
+    if backend == "memory":
+        return MemoryAnalysisStore()
+    if backend == "sqlite":
+        return SQLiteAnalysisStore(
+            db_path=os.environ.get("ANALYSIS_DB_PATH", "data/analyses.db"),
+            batch_size=int(os.environ.get("ANALYSIS_DB_BATCH_SIZE", "256")),
+            flush_interval=float(os.environ.get("ANALYSIS_DB_FLUSH_INTERVAL", "0.5")),
+            cache_size=int(os.environ.get("ANALYSIS_DB_CACHE_SIZE", "1024")),
+        )
+    raise ValueError(f"Unknown analysis store backend: {backend}")
@@ -0,0 +1,248 @@
+import json
+import math
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+class DurableJobQueue:
+    """SQLite-backed job queue shared by the API and out-of-process workers
+
+    Workers claim a job by leasing it for ``visibility_timeout`` seconds.
+    A job whose lease runs out without being completed becomes visible
+    again and is retried, up to ``max_attempts``. Every state change bumps
+    a monotonically increasing ``seq`` so the API can follow progress with
+    a cheap "changes since" query; the counter lives in its own table, so
+    purging finished jobs never resets it.
+
+    All methods are blocking; call them from a thread when on an event loop.
+    """
+
+    def __init__(self, db_path: str = "data/jobs.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.db_path), check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                visible_at REAL NOT NULL,
+                lease_owner TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                seq INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_claim
+                ON jobs (status, priority, visible_at);
+            CREATE INDEX IF NOT EXISTS idx_jobs_seq ON jobs (seq);
+            CREATE TABLE IF NOT EXISTS job_seq (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO job_seq (id, value)
+                SELECT 1, COALESCE(MAX(seq), 0) FROM jobs;
+            """
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _next_seq(self) -> int:
+        # Kept apart from the jobs so purging finished ones never winds it back
+        self._conn.execute("UPDATE job_seq SET value = value + 1 WHERE id = 1")
+        return self._conn.execute("SELECT value FROM job_seq WHERE id = 1").fetchone()[0]
+
+    def _transaction(self):
+        """Serialize writers across processes with BEGIN IMMEDIATE"""
+        conn = self._conn
+
+        class _Tx:
+            def __enter__(self_inner):
+                conn.execute("BEGIN IMMEDIATE")
+                return conn
+
+            def __exit__(self_inner, exc_type, exc, tb):
+                conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+        return _Tx()
+
+    def enqueue(self, job_id: str, payload: Dict[str, Any], priority: int = 0, max_attempts: int = 3):
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, payload, priority, status, max_attempts, visible_at, created_at, seq) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, json.dumps(payload), priority, max_attempts, now, now, self._next_seq()),
+            )
+
+    def claim(self, worker_id: str, visibility_timeout: float = 120) -> Optional[Dict[str, Any]]:
+        """Lease the next visible job, or return None if there is nothing to do"""
+
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            # Leases that ran out on their last attempt are dead
+            dead = conn.execute(
+                "SELECT job_id FROM jobs "
+                "WHERE status = 'running' AND visible_at <= ? AND attempts >= max_attempts",
+                (now,),
+            ).fetchall()
+            for (dead_id,) in dead:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'Visibility timeout exceeded', "
+                    "finished_at = ?, seq = ? WHERE job_id = ?",
+                    (now, self._next_seq(), dead_id),
+                )
+            row = conn.execute(
+                "SELECT job_id, payload, attempts FROM jobs "
+                "WHERE status IN ('queued', 'running') AND visible_at <= ? "
+                "ORDER BY priority, created_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, payload, attempts = row
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, "
+                "visible_at = ?, started_at = ?, seq = ? WHERE job_id = ?",
+                (worker_id, now + visibility_timeout, now, self._next_seq(), job_id),
+            )
+        return {"job_id": job_id, "payload": json.loads(payload), "attempt": attempts + 1}
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        """Store a job's result; ignored if the lease was lost to another worker"""
+
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, finished_at = ?, seq = ? "
+                "WHERE job_id = ? AND status = 'running' AND lease_owner = ?",
+                (json.dumps(result), now, self._next_seq(), job_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry_delay: float = 5) -> bool:
+        """Record a failed attempt; the job is retried until max_attempts"""
+
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET "
+                "status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END, "
+                "finished_at = CASE WHEN attempts >= max_attempts THEN ? ELSE NULL END, "
+                "visible_at = ?, error = ?, lease_owner = NULL, seq = ? "
+                "WHERE job_id = ? AND status = 'running' AND lease_owner = ?",
+                (now, now + retry_delay, error, self._next_seq(), job_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def mark_deleted(self, job_id: str):
+        """Publish the deletion of an analysis to every API process through the changes feed"""
+
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            seq = self._next_seq()
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'deleted', lease_owner = NULL, finished_at = ?, seq = ? WHERE job_id = ?",
+                (now, seq, job_id),
+            )
+            if cursor.rowcount == 0:
+                conn.execute(
+                    "INSERT INTO jobs (job_id, payload, status, max_attempts, visible_at, created_at, finished_at, seq) "
+                    "VALUES (?, '{}', 'deleted', 0, ?, ?, ?, ?)",
+                    (job_id, now, now, now, seq),
+                )
+
+    def changes_since(self, seq: int, limit: int = 500) -> List[Dict[str, Any]]:
+        """Jobs whose state changed after ``seq``, oldest change first"""
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, status, result, error, seq FROM jobs "
+                "WHERE seq > ? ORDER BY seq LIMIT ?",
+                (seq, limit),
+            ).fetchall()
+        return [
+            {
+                "job_id": job_id,
+                "status": status,
+                "result": json.loads(result) if result else None,
+                "error": error,
+                "seq": row_seq,
+            }
+            for job_id, status, result, error, row_seq in rows
+        ]
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+            ).fetchone()[0]
+
+    def _service_time(self, default: float) -> float:
+        """Average run time of the last 50 completed jobs"""
+        recent = self._conn.execute(
+            "SELECT AVG(finished_at - started_at) FROM ("
+            "SELECT finished_at, started_at FROM jobs WHERE status = 'done' "
+            "ORDER BY seq DESC LIMIT 50)"
+        ).fetchone()[0]
+        return recent or default
+
+    def _worker_count(self, now: float) -> int:
+        """Workers holding a lease or seen claiming in the last five minutes"""
+        workers = self._conn.execute(
+            "SELECT COUNT(DISTINCT lease_owner) FROM jobs "
+            "WHERE status = 'running' OR (started_at IS NOT NULL AND started_at > ?)",
+            (now - 300,),
+        ).fetchone()[0]
+        return max(1, workers)
+
+    def estimate_wait(self, default_service_time: float = 5.0) -> float:
+        """Seconds until a job enqueued now is expected to finish"""
+
+        now = time.time()
+        with self._lock:
+            service_time = self._service_time(default_service_time)
+            workers = self._worker_count(now)
+            queued = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()[0]
+        return (queued // workers + 1) * service_time
+
+    def retry_after(self, default_service_time: float = 5.0) -> int:
+        """Seconds until the queue is expected to have room again"""
+
+        with self._lock:
+            service_time = self._service_time(default_service_time)
+            workers = self._worker_count(time.time())
+        # A slot frees up as soon as any worker picks up its next job
+        return max(1, math.ceil(service_time / workers))
+
+    def purge_finished(self, older_than: float) -> int:
+        """Drop finished jobs that completed more than ``older_than`` seconds ago"""
+
+        with self._lock, self._transaction() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed', 'deleted') AND finished_at < ?",
+                (time.time() - older_than,),
+            )
+            return cursor.rowcount
+
+    def last_seq(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT value FROM job_seq WHERE id = 1").fetchone()[0]
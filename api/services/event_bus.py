@@ -0,0 +1,74 @@
+import asyncio
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set
+
+
+class AnalysisEventBus:
+    """In-process pub/sub for analysis status changes
+
+    Each subscriber gets its own small queue. Messages are published as
+    already-serialized strings so fanning out to many subscribers costs
+    one ``put_nowait`` each. A subscriber that falls behind loses its
+    oldest messages rather than blocking the publisher.
+
+    Long-poll waiters share a single future per analysis instead of a
+    queue each, so a parked request costs one coroutine and a timer.
+    """
+
+    def __init__(self, queue_size: int = 16):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # analysis_id -> [shared future, number of parked waiters]
+        self._waiters: Dict[str, List] = {}
+        self.published = 0
+        self.delivered = 0
+
+    @contextmanager
+    def subscribe(self, analysis_id: str) -> Iterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(analysis_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(analysis_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[analysis_id]
+
+    async def wait_for_change(self, analysis_id: str, timeout: float) -> Optional[str]:
+        """Park until the next message for an analysis, or return None on timeout"""
+
+        entry = self._waiters.get(analysis_id)
+        if entry is None:
+            entry = [asyncio.get_running_loop().create_future(), 0]
+            self._waiters[analysis_id] = entry
+        future = entry[0]
+        entry[1] += 1
+        try:
+            # Shield so a timed-out waiter doesn't cancel the shared future
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and self._waiters.get(analysis_id) is entry:
+                del self._waiters[analysis_id]
+
+    def waiter_count(self) -> int:
+        return sum(entry[1] for entry in self._waiters.values())
+
+    def publish(self, analysis_id: str, message: str):
+        self.published += 1
+        entry = self._waiters.pop(analysis_id, None)
+        if entry is not None and not entry[0].done():
+            entry[0].set_result(message)
+            self.delivered += entry[1]
+        for queue in self._subscribers.get(analysis_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+            self.delivered += 1
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
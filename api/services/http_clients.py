@@ -0,0 +1,128 @@
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from search_cache import get_search_cache
+from upstream_replay import RecordReplayTransport, get_upstream_archive
+
+from .metrics import track_external_call
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+SERPAPI_BASE_URL = "https://serpapi.com"
+ARK_BASE_URL = "https://ark.ap-southeast.bytepluses.com/api/v3"
+
+
+def create_http_client(base_url: str, timeout: Optional[float] = None) -> httpx.AsyncClient:
+    """Keep-alive connection pool for one upstream, configured from HTTP_* variables
+
+    HTTP/2 is negotiated when the ``h2`` package is installed and
+    HTTP2_ENABLED is not turned off; otherwise connections use HTTP/1.1.
+    With UPSTREAM_MODE set to record or replay, requests go through the
+    upstream archive.
+    """
+
+    limits = httpx.Limits(
+        max_connections=int(os.environ.get("HTTP_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.environ.get("HTTP_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", "60")),
+    )
+    timeout = httpx.Timeout(
+        timeout if timeout is not None else float(os.environ.get("HTTP_TIMEOUT", "30")),
+        connect=float(os.environ.get("HTTP_CONNECT_TIMEOUT", "5")),
+    )
+    http2 = HTTP2_AVAILABLE and os.environ.get("HTTP2_ENABLED", "true").lower() == "true"
+    transport = httpx.AsyncHTTPTransport(limits=limits, http2=http2)
+    archive = get_upstream_archive()
+    if archive is not None:
+        transport = RecordReplayTransport(archive, transport)
+    return httpx.AsyncClient(base_url=base_url, timeout=timeout, transport=transport)
+
+
+class _PooledClient:
+    """Lazily opens one shared AsyncClient, so it binds to the loop that uses it"""
+
+    def __init__(self, base_url: str, timeout: Optional[float] = None):
+        self.base_url = base_url
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def enabled(self) -> bool:
+        """An API key is configured, or answers come from the replay archive"""
+        archive = get_upstream_archive()
+        return bool(self.api_key) or (archive is not None and archive.mode == "replay")
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = create_http_client(self.base_url, self.timeout)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class SerpApiClient(_PooledClient):
+    """Async Google search through SerpAPI, sharing the persistent search cache"""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, timeout: Optional[float] = None):
+        super().__init__(base_url or os.environ.get("SERPAPI_BASE_URL", SERPAPI_BASE_URL), timeout)
+        self.api_key = api_key or os.environ.get("SERPAPI_API_KEY")
+
+    async def search(self, query: str, timeout: Optional[float] = None, **params) -> Dict[str, Any]:
+        """Raw SerpAPI response for a Google search"""
+
+        request_params = {"engine": "google", "q": query, "api_key": self.api_key, **params}
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        with track_external_call("serpapi"):
+            response = await self.client.get("/search.json", params=request_params, **kwargs)
+            response.raise_for_status()
+            return response.json()
+
+    async def organic_results(self, query: str, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Organic results for a query, served from the search cache when possible"""
+
+        search_cache = get_search_cache()
+        if search_cache is not None:
+            cached = search_cache.get(query)
+            if cached is not None:
+                return cached
+
+        results = await self.search(query, timeout=timeout)
+        organic_results = results.get("organic_results", [])
+        if search_cache is not None and "error" not in results:
+            await asyncio.to_thread(search_cache.put, query, organic_results)
+        return organic_results
+
+
+class ArkClient(_PooledClient):
+    """Async client for the Ark (OpenAI-compatible) chat completions API"""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, timeout: Optional[float] = None):
+        super().__init__(base_url or os.environ.get("ARK_BASE_URL", ARK_BASE_URL), timeout)
+        self.api_key = api_key or os.environ.get("ARK_API_KEY")
+
+    async def chat_completions(
+        self, model: str, messages: List[Dict[str, Any]], timeout: Optional[float] = None, **params
+    ) -> Dict[str, Any]:
+        """Create a chat completion and return the decoded response body"""
+
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        with track_external_call("ark"):
+            response = await self.client.post(
+                "/chat/completions",
+                json={"model": model, "messages": messages, **params},
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                **kwargs
+            )
+            response.raise_for_status()
+            return response.json()
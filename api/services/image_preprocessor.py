@@ -0,0 +1,299 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from .single_flight import SingleFlight
+
+# Content-addressed uploads are already named by their SHA-256
+_CONTENT_HASH_NAME = re.compile(r"[0-9a-f]{64}")
+
+FORMATS = {"jpeg": ("JPEG", ".jpg"), "webp": ("WEBP", ".webp")}
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode(image: Image.Image, path: Path, image_format: str, quality: int):
+    """Write atomically so concurrent readers never see a partial file"""
+    # Unique per writer: two processes may render the same file at once
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.part")
+    try:
+        image.save(tmp_path, image_format, quality=quality, optimize=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        _remove_files([tmp_path])
+        raise
+
+
+def preprocess_image(
+    image_path: str,
+    output_path: str,
+    thumbnail_path: str,
+    max_edge: int,
+    thumbnail_size: int,
+    image_format: str,
+    quality: int,
+):
+    """Rotate upright, drop metadata, downscale and re-encode one photo
+
+    Blocking Pillow work; run it on an executor. Metadata is stripped
+    simply by not passing EXIF/ICC data to the encoder.
+    """
+
+    with Image.open(image_path) as image:
+        # JPEG can decode straight to a smaller scale, far cheaper than a full decode
+        image.draft("RGB", (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    _encode(image, Path(output_path), image_format, quality)
+
+    image.thumbnail((thumbnail_size, thumbnail_size), Image.LANCZOS)
+    _encode(image, Path(thumbnail_path), image_format, quality)
+
+
+def _remove_files(paths: Iterable[Path]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class DiskCache:
+    """Byte budget over generated files in ``<directory>/<aa>/``
+
+    Files are indexed on first use (oldest modification first) and kept
+    in least recently used order; once they add up to more than
+    ``max_bytes`` the least recently used ones are deleted.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, extension: str):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.extension = extension
+
+        self._entries: "OrderedDict[Path, int]" = OrderedDict()
+        self._bytes = 0
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self.evictions = 0
+
+    def _scan(self) -> List[Tuple[float, Path, int]]:
+        found = []
+        for path in self.directory.glob(f"*/*{self.extension}"):
+            try:
+                stat_result = path.stat()
+            except FileNotFoundError:
+                continue
+            found.append((stat_result.st_mtime, path, stat_result.st_size))
+        return sorted(found)
+
+    async def load(self):
+        """Index files left by earlier runs"""
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            for _, path, size in await asyncio.to_thread(self._scan):
+                self._entries[path] = size
+                self._bytes += size
+            self._loaded = True
+        await self._evict()
+
+    def touch(self, *paths: Path) -> bool:
+        """Mark files as just used; False if any of them is missing
+
+        Files another process wrote since the index was loaded are adopted.
+        """
+        sizes = []
+        for path in paths:
+            try:
+                sizes.append(path.stat().st_size)
+            except FileNotFoundError:
+                return False
+        for path, size in zip(paths, sizes):
+            self._bytes += size - self._entries.pop(path, 0)
+            self._entries[path] = size
+        return True
+
+    async def add(self, *paths: Path):
+        """Account for newly written files, then evict down to the budget"""
+        for path in paths:
+            self._bytes -= self._entries.pop(path, 0)
+            self._entries[path] = path.stat().st_size
+            self._bytes += self._entries[path]
+        await self._evict(keep=set(paths))
+
+    async def _evict(self, keep=frozenset()):
+        victims = []
+        while self._bytes > self.max_bytes and self._entries:
+            path, size = next(iter(self._entries.items()))
+            if path in keep:
+                break
+            del self._entries[path]
+            self._bytes -= size
+            victims.append(path)
+        if victims:
+            self.evictions += len(victims)
+            await asyncio.to_thread(_remove_files, victims)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "bytes": self._bytes, "evictions": self.evictions}
+
+
+class ImagePreprocessor:
+    """Pipeline stage that prepares uploads for the LLM
+
+    Outputs are cached on disk by content hash and settings, under
+    ``<cache_dir>/<aa>/<sha256>_<max_edge>q<quality><ext>`` plus a
+    ``_thumb<thumbnail_size>`` variant, so the same photo is only ever
+    processed once while it stays within the ``max_bytes`` budget.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = "uploads/derived",
+        max_edge: int = 1536,
+        thumbnail_size: int = 256,
+        image_format: str = "jpeg",
+        quality: int = 85,
+        workers: int = 4,
+        uplink_mbps: float = 20.0,
+        max_bytes: int = 1024 * 1024 * 1024,
+    ):
+        if image_format not in FORMATS:
+            raise ValueError(f"Unknown image format: {image_format}")
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_edge = max_edge
+        self.thumbnail_size = thumbnail_size
+        self.image_format, self.extension = FORMATS[image_format]
+        self.quality = quality
+        # Used to turn bytes saved into an estimate of upload time saved
+        self.uplink_mbps = uplink_mbps
+
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-preprocess")
+        self._single_flight = SingleFlight()
+        self.cache = DiskCache(self.cache_dir, max_bytes, self.extension)
+
+        # Metrics
+        self.processed = 0
+        self.cache_hits = 0
+        self.failures = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.processing_time = 0.0
+
+    def cached_thumbnail(self, content_hash: str) -> Optional[Path]:
+        """The thumbnail made while preprocessing this photo, if it is still cached"""
+        _, thumbnail_path = self._outputs_for(content_hash)
+        return thumbnail_path if self.cache.touch(thumbnail_path) else None
+
+    def _outputs_for(self, content_hash: str):
+        stem = f"{content_hash}_{self.max_edge}q{self.quality}"
+        directory = self.cache_dir / content_hash[:2]
+        return (
+            directory / f"{stem}{self.extension}",
+            directory / f"{stem}_thumb{self.thumbnail_size}{self.extension}",
+        )
+
+    async def process(self, image_path: str, content_hash: Optional[str] = None) -> Dict[str, Any]:
+        """Return the preprocessed image, its thumbnail and what was saved"""
+
+        loop = asyncio.get_event_loop()
+        if content_hash is None and _CONTENT_HASH_NAME.fullmatch(Path(image_path).stem):
+            content_hash = Path(image_path).stem
+        if content_hash is None:
+            content_hash = await loop.run_in_executor(self._pool, _file_sha256, image_path)
+        output_path, thumbnail_path = self._outputs_for(content_hash)
+
+        await self.cache.load()
+        cached = self.cache.touch(output_path, thumbnail_path)
+        elapsed = 0.0
+        if cached:
+            self.cache_hits += 1
+        else:
+            started = time.perf_counter()
+            # Concurrent analyses of the same photo share one encode
+            await self._single_flight.do(
+                content_hash, self._run, image_path, output_path, thumbnail_path
+            )
+            elapsed = time.perf_counter() - started
+
+        original_bytes = os.path.getsize(image_path)
+        output_bytes = os.path.getsize(output_path)
+        bytes_saved = original_bytes - output_bytes
+        return {
+            "source": image_path,
+            "path": str(output_path),
+            "thumbnail": str(thumbnail_path),
+            "cached": cached,
+            "original_bytes": original_bytes,
+            "output_bytes": output_bytes,
+            "bytes_saved": bytes_saved,
+            "preprocess_ms": round(elapsed * 1000, 1),
+            "transfer_ms_saved": round(bytes_saved * 8 / (self.uplink_mbps * 1e6) * 1000, 1),
+        }
+
+    async def _run(self, image_path: str, output_path: Path, thumbnail_path: Path):
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        loop = asyncio.get_event_loop()
+        started = time.perf_counter()
+        try:
+            await loop.run_in_executor(
+                self._pool, preprocess_image, image_path, str(output_path), str(thumbnail_path),
+                self.max_edge, self.thumbnail_size, self.image_format, self.quality
+            )
+        except Exception:
+            self.failures += 1
+            raise
+        self.processed += 1
+        self.processing_time += time.perf_counter() - started
+        self.bytes_in += os.path.getsize(image_path)
+        self.bytes_out += os.path.getsize(output_path)
+        await self.cache.add(output_path, thumbnail_path)
+
+    async def process_many(self, image_paths: List[str], content_hashes: Optional[List[str]] = None) -> List[Optional[Dict[str, Any]]]:
+        """Preprocess images concurrently; images that fail come back as None"""
+
+        hashes = content_hashes or [None] * len(image_paths)
+        results = await asyncio.gather(
+            *(self.process(path, content_hash) for path, content_hash in zip(image_paths, hashes)),
+            return_exceptions=True
+        )
+        return [None if isinstance(result, Exception) else result for result in results]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "processed": self.processed,
+            "cache_hits": self.cache_hits,
+            "failures": self.failures,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_in - self.bytes_out,
+            "avg_preprocess_ms": round(self.processing_time / self.processed * 1000, 1) if self.processed else 0.0,
+            "cache": self.cache.stats(),
+        }
@@ -0,0 +1,280 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import aiofiles
+from PIL import Image, ImageOps
+from starlette.responses import Response
+
+from .image_preprocessor import FORMATS, DiskCache, ImagePreprocessor, _encode
+from .response_cache import etag_matches
+from .single_flight import SingleFlight
+
+CHUNK_SIZE = 256 * 1024
+
+# Uploads get unique names and are never rewritten in place
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class RangeNotSatisfiable(ValueError):
+    """Raised for a Range header that selects no bytes of the file"""
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) of a single ``bytes=`` range, or None to send the whole file
+
+    Multiple ranges are answered with the whole file, which RFC 9110
+    allows, rather than a multipart body.
+    """
+
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length == 0:
+                raise RangeNotSatisfiable(header)
+            start, end = max(0, size - length), size - 1
+    except ValueError:
+        return None
+    if start < 0 or start >= size or end < start:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+class RangeFileResponse(Response):
+    """File body (or a slice of it) sent without loading the file into memory
+
+    Uses the ASGI zero-copy send extension (sendfile) when the server
+    offers it, otherwise streams ``CHUNK_SIZE`` reads.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        start: int,
+        end: int,
+        status_code: int,
+        headers: Dict[str, str],
+        media_type: str,
+        send_body: bool = True,
+    ):
+        self.path = path
+        self.start = start
+        self.length = end - start + 1
+        self.status_code = status_code
+        self.media_type = media_type
+        self.send_body = send_body
+        self.background = None
+        self.init_headers({**headers, "content-length": str(self.length)})
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f,
+                    "offset": self.start,
+                    "count": self.length,
+                    "more_body": False,
+                })
+            return
+
+        remaining = self.length
+        async with aiofiles.open(self.path, "rb") as f:
+            await f.seek(self.start)
+            while remaining > 0:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            # File shrank under us; end the response rather than hang
+            await send({"type": "http.response.body", "body": b""})
+
+
+def file_response(
+    request_headers,
+    path: Path,
+    stat_result: os.stat_result,
+    cache_control: str = IMMUTABLE_CACHE_CONTROL,
+    send_body: bool = True,
+    accel_redirect: Optional[str] = None,
+) -> Response:
+    """200, 206, 304 or 416 response for a file, honouring conditional and Range headers
+
+    With ``accel_redirect`` set, the body is left to the front proxy
+    (nginx ``X-Accel-Redirect``), which then does the sendfile and ranges.
+    """
+
+    etag = file_etag(stat_result)
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif _not_modified_since(request_headers.get("if-modified-since"), stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    if accel_redirect is not None:
+        return Response(media_type=media_type, headers={**headers, "X-Accel-Redirect": accel_redirect})
+
+    size = stat_result.st_size
+    byte_range = None
+    range_header = request_headers.get("range")
+    if range_header and size > 0 and request_headers.get("if-range", etag) in (etag, last_modified):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        return RangeFileResponse(path, 0, size - 1, 200, headers, media_type, send_body)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return RangeFileResponse(path, start, end, 206, headers, media_type, send_body)
+
+
+def _not_modified_since(header: Optional[str], mtime: float) -> bool:
+    if not header:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def make_thumbnail(source_path: str, output_path: str, size: int, image_format: str, quality: int):
+    """Upright, downscaled copy of a photo, written to a temporary file and renamed; blocking Pillow work"""
+
+    with Image.open(source_path) as image:
+        image.draft("RGB", (size, size))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGB")
+    image.thumbnail((size, size), Image.LANCZOS)
+    output = Path(output_path)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    _encode(image, output, image_format, quality)
+
+
+class ThumbnailCache:
+    """Size variants of uploaded photos, generated on demand into a disk cache
+
+    Requested sizes snap up to one of ``sizes`` so the number of variants
+    per photo stays small. Files live under ``<cache_dir>/<aa>/<key>_<size><ext>``,
+    keyed on the source path and modification time; once the cache
+    exceeds ``max_bytes`` the least recently served variants are deleted.
+    A variant the size of the ``preprocessor`` thumbnail is served from
+    the preprocessor's cache when it has one for the photo.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = "uploads/thumbs",
+        max_bytes: int = 256 * 1024 * 1024,
+        sizes: Tuple[int, ...] = (128, 256, 512, 1024),
+        image_format: str = "jpeg",
+        quality: int = 80,
+        workers: int = 2,
+        preprocessor: Optional[ImagePreprocessor] = None,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.sizes = tuple(sorted(sizes))
+        self.image_format, self.extension = FORMATS[image_format]
+        self.quality = quality
+        self.preprocessor = preprocessor
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+        self.single_flight = SingleFlight()
+        self.cache = DiskCache(self.cache_dir, max_bytes, self.extension)
+
+        self.hits = 0
+        self.derived_hits = 0
+        self.generated = 0
+        self.generate_seconds = 0.0
+
+    def variant_size(self, requested: int) -> int:
+        """Smallest configured size at least as large as requested"""
+        for size in self.sizes:
+            if size >= requested:
+                return size
+        return self.sizes[-1]
+
+    def _variant_path(self, source: Path, stat_result: os.stat_result, size: int) -> Path:
+        key = hashlib.blake2b(f"{source}:{stat_result.st_mtime_ns}".encode(), digest_size=16).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}_{size}{self.extension}"
+
+    async def get(
+        self, source: Path, stat_result: os.stat_result, requested_size: int, content_hash: Optional[str] = None
+    ) -> Path:
+        """Path of the variant of ``source`` for ``requested_size``, generating it if needed"""
+
+        size = self.variant_size(requested_size)
+        if self.preprocessor is not None and content_hash and size == self.preprocessor.thumbnail_size:
+            derived = self.preprocessor.cached_thumbnail(content_hash)
+            if derived is not None:
+                self.derived_hits += 1
+                return derived
+
+        await self.cache.load()
+        path = self._variant_path(source, stat_result, size)
+        if self.cache.touch(path):
+            self.hits += 1
+            return path
+        return await self.single_flight.do(path, self._generate, source, path, size)
+
+    async def _generate(self, source: Path, path: Path, size: int) -> Path:
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self._executor, make_thumbnail, str(source), str(path), size, self.image_format, self.quality
+        )
+        self.generate_seconds += time.perf_counter() - started
+        self.generated += 1
+        await self.cache.add(path)
+        return path
+
+    def stats(self) -> Dict[str, Any]:
+        cache = self.cache.stats()
+        return {
+            "entries": cache["entries"],
+            "bytes": cache["bytes"],
+            "hits": self.hits,
+            "derived_hits": self.derived_hits,
+            "generated": self.generated,
+            "evictions": cache["evictions"],
+            "generate_seconds": round(self.generate_seconds, 3),
+            "in_flight": self.single_flight.stats()["in_flight"],
+        }
@@ -0,0 +1,147 @@
+import asyncio
+import itertools
+import logging
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Lower value runs first
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted to a saturated queue"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Analysis queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AnalysisJobQueue:
+    """Bounded in-process job queue served by a fixed pool of workers
+
+    Jobs wait in priority lanes (interactive before batch, FIFO inside
+    a lane). Submitting to a full queue raises QueueFullError with a
+    Retry-After hint. Service times are tracked as an exponentially
+    weighted moving average to estimate how long a new job will wait.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[..., Awaitable[Any]],
+        workers: int = 4,
+        max_depth: int = 100,
+        initial_service_time: float = 5.0,
+    ):
+        self.handler = handler
+        self.worker_count = workers
+        self.max_depth = max_depth
+
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers = []
+        self._sequence = itertools.count()
+        self._lane_depth = {lane: 0 for lane in PRIORITIES}
+
+        # Metrics
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.avg_service_time = initial_service_time
+        self.avg_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    async def start(self):
+        if self._queue is not None:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.worker_count)
+        ]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    @property
+    def depth(self) -> int:
+        return sum(self._lane_depth.values())
+
+    def is_full(self) -> bool:
+        return self.depth >= self.max_depth
+
+    def _jobs_ahead(self, priority: str) -> int:
+        """Queued jobs that will run before a new job in this lane"""
+        rank = PRIORITIES[priority]
+        return sum(depth for lane, depth in self._lane_depth.items() if PRIORITIES[lane] <= rank)
+
+    def estimate_wait(self, priority: str = "interactive") -> float:
+        """Seconds until a job submitted now is expected to finish"""
+        ahead = self._jobs_ahead(priority) + self.in_flight
+        rounds = ahead // self.worker_count
+        return (rounds + 1) * self.avg_service_time
+
+    def retry_after(self) -> int:
+        """Seconds until the queue is expected to have room again"""
+        # A slot frees up as soon as any worker picks up its next job
+        return max(1, math.ceil(self.avg_service_time / self.worker_count))
+
+    def submit(self, job_id: str, *args, priority: str = "interactive") -> float:
+        """Queue a job and return its estimated completion time in seconds"""
+
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        if self._queue is None:
+            raise RuntimeError("Job queue is not running")
+        if self.is_full():
+            self.rejected += 1
+            raise QueueFullError(self.retry_after())
+
+        estimate = self.estimate_wait(priority)
+        self._lane_depth[priority] += 1
+        self._queue.put_nowait((
+            PRIORITIES[priority], next(self._sequence), time.monotonic(), priority, job_id, args
+        ))
+        return estimate
+
+    async def _worker(self):
+        while True:
+            _, _, enqueued_at, priority, job_id, args = await self._queue.get()
+            self._lane_depth[priority] -= 1
+
+            waited = time.monotonic() - enqueued_at
+            self.avg_wait_time = 0.8 * self.avg_wait_time + 0.2 * waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+
+            self.in_flight += 1
+            started = time.monotonic()
+            try:
+                await self.handler(job_id, *args)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.warning("Job %s failed: %s", job_id, e)
+            finally:
+                self.in_flight -= 1
+                self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * (time.monotonic() - started)
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.worker_count,
+            "depth": self.depth,
+            "lanes": dict(self._lane_depth),
+            "max_depth": self.max_depth,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_service_time": self.avg_service_time,
+            "avg_wait_time": self.avg_wait_time,
+            "max_wait_time": self.max_wait_time,
+        }
@@ -0,0 +1,155 @@
+import asyncio
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .http_clients import ArkClient
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMDeadlineExceeded(Exception):
+    """Raised when a completion does not finish within its deadline"""
+
+
+class LLMGateway:
+    """Shared entry point for every LLM call made by the service
+
+    Concurrency is capped at ``max_concurrency`` and adapts to the
+    provider: a 429 halves the current limit, each success raises it
+    again (AIMD), so peaks back off without leaving capacity idle.
+    Retryable failures are retried with full-jitter exponential backoff
+    (or the server's Retry-After) until ``deadline`` seconds have passed.
+    """
+
+    def __init__(
+        self,
+        client: ArkClient,
+        max_concurrency: int = 8,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        deadline: float = 60.0,
+    ):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self._slots: Optional[asyncio.Condition] = None
+
+        # Per-model request and token counters
+        self.usage: Dict[str, Dict[str, int]] = {}
+
+    def _usage_for(self, model: str) -> Dict[str, int]:
+        if model not in self.usage:
+            self.usage[model] = {
+                "requests": 0,
+                "retries": 0,
+                "errors": 0,
+                "rate_limited": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "total_tokens": 0,
+            }
+        return self.usage[model]
+
+    async def _acquire(self):
+        if self._slots is None:
+            self._slots = asyncio.Condition()
+        async with self._slots:
+            await self._slots.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def _release(self):
+        async with self._slots:
+            self.in_flight -= 1
+            self._slots.notify_all()
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after is not None:
+                try:
+                    return min(self.max_delay, float(retry_after))
+                except ValueError:
+                    pass
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def complete(
+        self, model: str, messages: List[Dict[str, Any]], deadline: Optional[float] = None, **params
+    ) -> Dict[str, Any]:
+        """Run a chat completion with retries, returning the response body"""
+
+        usage = self._usage_for(model)
+        expires_at = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                usage["errors"] += 1
+                raise LLMDeadlineExceeded(f"LLM call to {model} exceeded its deadline")
+
+            response = None
+            try:
+                # The slot wait counts against the deadline too
+                await asyncio.wait_for(self._acquire(), timeout=remaining)
+            except asyncio.TimeoutError:
+                usage["errors"] += 1
+                raise LLMDeadlineExceeded(f"LLM call to {model} exceeded its deadline")
+
+            try:
+                usage["requests"] += 1
+                body = await self.client.chat_completions(
+                    model, messages, timeout=max(0.1, expires_at - time.monotonic()), **params
+                )
+            except httpx.HTTPStatusError as e:
+                response = e.response
+                if response.status_code == 429:
+                    usage["rate_limited"] += 1
+                    self.limit = max(1.0, self.limit / 2)
+                if response.status_code not in RETRYABLE_STATUS or attempt >= self.max_retries:
+                    usage["errors"] += 1
+                    raise
+            except httpx.TimeoutException:
+                if expires_at - time.monotonic() <= 0:
+                    usage["errors"] += 1
+                    raise LLMDeadlineExceeded(f"LLM call to {model} exceeded its deadline")
+                if attempt >= self.max_retries:
+                    usage["errors"] += 1
+                    raise
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    usage["errors"] += 1
+                    raise
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+                tokens = body.get("usage") or {}
+                for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                    usage[key] += tokens.get(key) or 0
+                return body
+            finally:
+                await self._release()
+
+            # Back off outside the slot so other calls can use it
+            delay = self._backoff(attempt, response)
+            if time.monotonic() + delay >= expires_at:
+                usage["errors"] += 1
+                raise LLMDeadlineExceeded(f"LLM call to {model} exceeded its deadline")
+            attempt += 1
+            usage["retries"] += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "current_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "models": {model: dict(counters) for model, counters in self.usage.items()},
+        }
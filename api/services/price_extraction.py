@@ -0,0 +1,160 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+_MULTIPLIER = r"k|K(?![A-Za-z])|พัน|หมื่น"
+_PREFIX = r"฿|THB|ราคา"
+_SUFFIX = r"฿|THB|บาท|baht|Baht"
+
+# "฿1,200", "THB 1200", "1,200 บาท", "15k", "3 พัน บาท", "1,000-1,500 บาท", "฿12k ถึง 15k", "2 - 3k"
+PRICE_PATTERN = re.compile(
+    rf"(?:(?P<prefix>{_PREFIX})\s*:?\s*|(?<![A-Za-z0-9.,]))"
+    rf"(?P<low>{_NUMBER})\s*(?P<low_multiplier>{_MULTIPLIER})?"
+    rf"(?:\s*(?:-|–|~|ถึง|to)\s*(?:฿|THB)?\s*(?P<high>{_NUMBER})\s*(?P<high_multiplier>{_MULTIPLIER})?)?"
+    rf"\s*(?P<suffix>{_SUFFIX})?"
+)
+
+_MULTIPLIERS = {"k": 1_000, "K": 1_000, "พัน": 1_000, "หมื่น": 10_000}
+
+# Listings outside this range are typos, phone numbers or years, not prices
+MIN_PRICE = 1
+MAX_PRICE = 10_000_000
+
+# "ราคา 2020" names a model year far more often than a price
+_YEAR = re.compile(r"(19[89]\d|20[0-3]\d)")
+
+# How much each SerpAPI field is trusted when weighting listings
+SOURCE_WEIGHTS = {"structured": 1.0, "title": 0.8, "snippet": 0.6}
+
+
+def _to_number(value: str, multiplier: Optional[str]) -> float:
+    return float(value.replace(",", "")) * _MULTIPLIERS.get(multiplier, 1)
+
+
+def extract_prices(text: str) -> List[float]:
+    """Prices mentioned in free text, in THB; a range counts as its midpoint"""
+
+    prices = []
+    for match in PRICE_PATTERN.finditer(text or ""):
+        has_unit = match.group("prefix") or match.group("suffix")
+        # A bare "15k" or "2-3k" is a price, "4K" display resolution is not
+        has_multiplier = any(
+            match.group(group) in ("k", "พัน", "หมื่น") for group in ("low_multiplier", "high_multiplier")
+        )
+        if not (has_unit or has_multiplier):
+            continue
+        # Only the word "ราคา" in front of a bare year-like number
+        if (
+            match.group("prefix") == "ราคา" and not match.group("suffix") and not has_multiplier
+            and not match.group("high") and _YEAR.fullmatch(match.group("low"))
+        ):
+            continue
+        low_multiplier = match.group("low_multiplier") or match.group("high_multiplier")
+        low = _to_number(match.group("low"), low_multiplier)
+        if match.group("high"):
+            high = _to_number(match.group("high"), match.group("high_multiplier") or low_multiplier)
+            price = (low + high) / 2
+        else:
+            price = low
+        if MIN_PRICE <= price <= MAX_PRICE:
+            prices.append(price)
+    return prices
+
+
+def _structured_price(result: Dict[str, Any]) -> Optional[float]:
+    """Price from SerpAPI's parsed fields (shopping results and rich snippets)"""
+
+    for key in ("extracted_price", "price"):
+        value = result.get(key)
+        if isinstance(value, (int, float)) and MIN_PRICE <= value <= MAX_PRICE:
+            return float(value)
+        if isinstance(value, str):
+            prices = extract_prices(value if re.search(_SUFFIX + "|" + _PREFIX, value) else value + " บาท")
+            if prices:
+                return prices[0]
+
+    rich_snippet = result.get("rich_snippet") or {}
+    for part in ("top", "bottom"):
+        section = rich_snippet.get(part) or {}
+        extensions = section.get("detected_extensions") or {}
+        low, high = extensions.get("price_from"), extensions.get("price_to")
+        if isinstance(low, (int, float)) and isinstance(high, (int, float)):
+            return (low + high) / 2
+        value = extensions.get("price")
+        if isinstance(value, (int, float)) and MIN_PRICE <= value <= MAX_PRICE:
+            return float(value)
+        for extension in section.get("extensions") or []:
+            prices = extract_prices(str(extension))
+            if prices:
+                return prices[0]
+    return None
+
+
+def extract_listing_price(result: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """(price, weight) for one search result, from the most trusted field that has one"""
+
+    price = _structured_price(result)
+    if price is not None:
+        return price, SOURCE_WEIGHTS["structured"]
+    for field in ("title", "snippet"):
+        prices = extract_prices(result.get(field, ""))
+        if prices:
+            return prices[0], SOURCE_WEIGHTS[field]
+    return None
+
+
+def weighted_percentile(values: np.ndarray, weights: np.ndarray, percentiles: Sequence[float]) -> np.ndarray:
+    """Percentiles (0-100) of ``values`` where each value counts ``weight`` times"""
+
+    order = np.argsort(values)
+    values = values[order]
+    weights = weights[order]
+    cumulative = np.cumsum(weights) - 0.5 * weights
+    cumulative /= weights.sum()
+    return np.interp(np.asarray(percentiles, dtype=float) / 100.0, cumulative, values)
+
+
+def iqr_mask(values: np.ndarray, k: float = 1.5) -> np.ndarray:
+    """Values inside Tukey's fences; needs at least 4 values to trim anything"""
+
+    if values.size < 4:
+        return np.ones(values.shape, dtype=bool)
+    q1, q3 = np.percentile(values, [25, 75])
+    spread = q3 - q1
+    return (values >= q1 - k * spread) & (values <= q3 + k * spread)
+
+
+def price_statistics(prices: Iterable[float], weights: Optional[Iterable[float]] = None) -> Optional[Dict[str, Any]]:
+    """Outlier-resistant summary of listing prices
+
+    Prices outside the IQR fences are dropped, then the suggested price
+    is the weighted median and the range the weighted 10th-90th
+    percentiles (the trimmed min/max for fewer than 5 listings).
+    """
+
+    values = np.asarray(list(prices), dtype=float)
+    if values.size == 0:
+        return None
+    weights = np.ones_like(values) if weights is None else np.asarray(list(weights), dtype=float)
+
+    keep = iqr_mask(values)
+    kept_values, kept_weights = values[keep], weights[keep]
+    if kept_weights.sum() <= 0:
+        # No usable weights: count every listing the same
+        kept_weights = np.ones_like(kept_values)
+    if kept_values.size >= 5:
+        low, median, high = weighted_percentile(kept_values, kept_weights, [10, 50, 90])
+    else:
+        low, high = kept_values.min(), kept_values.max()
+        median = weighted_percentile(kept_values, kept_weights, [50])[0]
+
+    return {
+        "min": float(low),
+        "max": float(high),
+        "suggested": float(median),
+        "count": int(kept_values.size),
+        "outliers": int(values.size - kept_values.size),
+    }
+
@@ -0,0 +1,132 @@
+import copy
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from PIL import Image
+
+HASH_BITS = 64
+
+
+def dhash(image_path: str, hash_size: int = 8) -> int:
+    """Compute a 64-bit difference hash of an image
+
+    The image is shrunk to (hash_size + 1) x hash_size greyscale pixels
+    and each bit records whether a pixel is brighter than its right
+    neighbour. Re-encoding, resizing and small crops barely move it.
+    """
+
+    with Image.open(image_path) as image:
+        small = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+        pixels = list(small.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class PerceptualResultCache:
+    """Analysis results keyed on perceptual hashes, with TTL and LRU eviction
+
+    Near-duplicate lookups use multi-index hashing: each hash is split
+    into ``max_distance + 1`` segments and any hash within
+    ``max_distance`` bits must match at least one segment exactly
+    (pigeonhole), so only a few candidates are ever compared.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 3600, max_distance: int = 4):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+
+        self._entries: "OrderedDict[int, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._segments = self._segment_masks(max_distance + 1)
+        self._index: List[Dict[int, Set[int]]] = [{} for _ in self._segments]
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _segment_masks(count: int) -> List[Tuple[int, int]]:
+        """Split HASH_BITS into ``count`` (shift, mask) segments"""
+        masks = []
+        start = 0
+        for i in range(count):
+            width = HASH_BITS // count + (1 if i < HASH_BITS % count else 0)
+            masks.append((start, (1 << width) - 1))
+            start += width
+        return masks
+
+    def _keys(self, value: int):
+        for i, (shift, mask) in enumerate(self._segments):
+            yield i, (value >> shift) & mask
+
+    def _add_to_index(self, value: int):
+        for i, key in self._keys(value):
+            self._index[i].setdefault(key, set()).add(value)
+
+    def _remove(self, value: int):
+        self._entries.pop(value, None)
+        for i, key in self._keys(value):
+            bucket = self._index[i].get(key)
+            if bucket is not None:
+                bucket.discard(value)
+                if not bucket:
+                    del self._index[i][key]
+
+    def get(self, value: int) -> Optional[Dict[str, Any]]:
+        """Return a copy of the closest cached result within max_distance"""
+
+        now = time.monotonic()
+        best = None
+        best_distance = self.max_distance + 1
+        candidates = set()
+        for i, key in self._keys(value):
+            candidates.update(self._index[i].get(key, ()))
+
+        for candidate in candidates:
+            expires_at, _ = self._entries[candidate]
+            if expires_at <= now:
+                self._remove(candidate)
+                self.evictions += 1
+                continue
+            distance = hamming_distance(value, candidate)
+            if distance < best_distance:
+                best, best_distance = candidate, distance
+
+        if best is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(best)
+        return copy.deepcopy(self._entries[best][1])
+
+    def put(self, value: int, result: Dict[str, Any]):
+        if value in self._entries:
+            self._remove(value)
+        self._entries[value] = (time.monotonic() + self.ttl, copy.deepcopy(result))
+        self._add_to_index(value)
+
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
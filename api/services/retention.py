@@ -0,0 +1,274 @@
+import asyncio
+import heapq
+import inspect
+import logging
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, every process sweeps
+    fcntl = None
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+RECORDS_DELETED = REGISTRY.counter(
+    "retention_records_deleted_total", "Analyses removed by the retention sweeper", ("status",)
+)
+BYTES_RECLAIMED = REGISTRY.counter(
+    "retention_bytes_reclaimed_total", "Disk space freed by the retention sweeper"
+)
+
+# Pending and processing records past this age were abandoned mid-run
+IN_FLIGHT_STATUSES = ("pending", "processing")
+
+# Records created elsewhere are picked up by re-reading this far back, which
+# covers uploads that took a while to be stored after their created_at
+LOAD_OVERLAP = 600.0
+
+
+def _timestamp(created_at: str) -> float:
+    try:
+        return datetime.fromisoformat(created_at).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class RetentionSweeper:
+    """Background expiry of old analyses and their uploaded images
+
+    ``ttls`` maps a status to how long (seconds) records in that status
+    are kept after creation; statuses without a TTL are kept forever.
+    Expiry times sit in a min-heap, so a sweep pops only records that are
+    due; the latest expiry of each record is kept alongside, and heap
+    entries that no longer match it are skipped. Entries are checked
+    against the store before deleting: a record whose status changed
+    since it was indexed is re-queued under its new TTL. Deletions run in
+    batches of ``batch_size`` with ``batch_interval`` seconds between
+    them, and file removal happens on a worker thread. A batch record is
+    removed with the last of its items.
+
+    With ``lock_path`` only the process holding an exclusive lock on that
+    file sweeps; it indexes records other processes create by re-reading
+    recent ones from the store before every sweep. The others take over
+    if it exits.
+    """
+
+    def __init__(
+        self,
+        store,
+        storage,
+        ttls: Dict[str, float],
+        batch_size: int = 100,
+        batch_interval: float = 1.0,
+        sweep_interval: float = 60.0,
+        on_delete: Optional[Callable[[str], Any]] = None,
+        lock_path: Optional[str] = None,
+    ):
+        self.store = store
+        self.storage = storage
+        self.ttls = {status: ttl for status, ttl in ttls.items() if ttl and ttl > 0}
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.sweep_interval = sweep_interval
+        self.on_delete = on_delete
+        self.lock_path = Path(lock_path) if lock_path else None
+
+        self._heap: List[Tuple[float, str]] = []
+        self._expiry: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._lock_file = None
+        self._sweeping = False
+        self._loaded_at: Optional[float] = None
+
+        self.records_deleted = 0
+        self.bytes_reclaimed = 0
+        self.requeued = 0
+        self.last_sweep: Optional[float] = None
+
+    def expires_at(self, status: str, created_at: str) -> Optional[float]:
+        ttl = self.ttls.get(status)
+        if ttl is None:
+            return None
+        return _timestamp(created_at) + ttl
+
+    def track(self, record: Dict[str, Any]):
+        """Index a new record or a status change"""
+        if self._sweeping:
+            self._index(record["analysis_id"], self.expires_at(record["status"], record["created_at"]))
+
+    def _index(self, analysis_id: str, expires_at: Optional[float]):
+        if expires_at is None:
+            self._expiry.pop(analysis_id, None)
+            return
+        if self._expiry.get(analysis_id) == expires_at:
+            return
+        self._expiry[analysis_id] = expires_at
+        heapq.heappush(self._heap, (expires_at, analysis_id))
+        # Superseded entries are skipped when popped; rebuild once they dominate
+        if len(self._heap) > 2 * len(self._expiry) + 1024:
+            self._heap = [(expires_at, analysis_id) for analysis_id, expires_at in self._expiry.items()]
+            heapq.heapify(self._heap)
+
+    async def start(self):
+        if not self.ttls or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self._sweeping = False
+
+    def _acquire(self) -> bool:
+        """Whether this process is the one that sweeps"""
+        if self.lock_path is None or fcntl is None:
+            return True
+        if self._lock_file is None:
+            self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+            self._lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    async def _load(self):
+        """Index every record on taking over, then only recently created ones"""
+        since = None
+        if self._loaded_at is not None:
+            since = datetime.fromtimestamp(self._loaded_at - LOAD_OVERLAP).isoformat()
+        self._loaded_at = time.time()
+        entries = await self.store.expiry_entries(created_after=since)
+        for analysis_id, status, created_at in entries:
+            self._index(analysis_id, self.expires_at(status, created_at))
+        if since is None:
+            logger.info("Retention index loaded with %d records (pid %d)", len(self._expiry), os.getpid())
+
+    async def _run(self):
+        while True:
+            try:
+                if self._sweeping or self._acquire():
+                    self._sweeping = True
+                    await self._load()
+                    await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Retention sweep failed: %s", e)
+            await asyncio.sleep(self.sweep_interval)
+
+    def _due(self, now: float) -> List[str]:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            expires_at, analysis_id = heapq.heappop(self._heap)
+            if self._expiry.get(analysis_id) == expires_at:
+                del self._expiry[analysis_id]
+                due.append(analysis_id)
+        return due
+
+    def _next_expiry(self) -> Optional[float]:
+        while self._heap and self._expiry.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    async def sweep(self) -> int:
+        """Delete everything that has expired, one rate-limited batch at a time"""
+
+        deleted = 0
+        while True:
+            now = time.time()
+            due = self._due(now)
+            if not due:
+                break
+            deleted += await self._delete_batch(due, now)
+            next_expiry = self._next_expiry()
+            if next_expiry is not None and next_expiry <= now:
+                await asyncio.sleep(self.batch_interval)
+        self.last_sweep = time.time()
+        if deleted:
+            logger.info("Retention sweep removed %d analyses", deleted)
+        return deleted
+
+    async def _delete_batch(self, analysis_ids: List[str], now: float) -> int:
+        expired = []
+        for analysis_id in analysis_ids:
+            record = await self.store.get(analysis_id)
+            if record is None:
+                continue
+            expires_at = self.expires_at(record["status"], record["created_at"])
+            if expires_at is None:
+                continue
+            if expires_at > now:
+                # Status changed since it was indexed
+                self._index(analysis_id, expires_at)
+                self.requeued += 1
+                continue
+            expired.append(record)
+
+        for record in expired:
+            await self.store.delete(record["analysis_id"])
+            if self.on_delete is not None:
+                result = self.on_delete(record["analysis_id"])
+                if inspect.isawaitable(result):
+                    await result
+            RECORDS_DELETED.inc(status=record["status"])
+        await self._delete_finished_batches({record["batch_id"] for record in expired if record.get("batch_id")})
+
+        freed = await asyncio.to_thread(self._purge_files, expired)
+        BYTES_RECLAIMED.inc(freed)
+        self.records_deleted += len(expired)
+        self.bytes_reclaimed += freed
+        return len(expired)
+
+    async def _delete_finished_batches(self, batch_ids):
+        """Drop batch records none of whose items are left"""
+        for batch_id in batch_ids:
+            batch = await self.store.get_batch(batch_id)
+            if batch is None:
+                continue
+            for item in batch["items"]:
+                if await self.store.get(item["analysis_id"]) is not None:
+                    break
+            else:
+                await self.store.delete_batch(batch_id)
+
+    def _purge_files(self, records: List[Dict[str, Any]]) -> int:
+        freed = 0
+        for record in records:
+            try:
+                freed += self.storage.purge_analysis(record["analysis_id"], record.get("image_paths", []))
+            except OSError as e:
+                logger.warning("Could not remove images of %s: %s", record["analysis_id"], e)
+        return freed
+
+    def indexed(self) -> int:
+        """Records waiting to expire; safe to call from any thread"""
+        return len(self._expiry)
+
+    def stats(self) -> Dict[str, Any]:
+        # _next_expiry prunes the heap, so call this on the event loop only
+        return {
+            "enabled": bool(self.ttls),
+            "sweeping": self._sweeping,
+            "ttls": self.ttls,
+            "indexed": self.indexed(),
+            "next_expiry": self._next_expiry(),
+            "records_deleted": self.records_deleted,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "requeued": self.requeued,
+            "last_sweep": self.last_sweep,
+        }
@@ -0,0 +1,64 @@
+import asyncio
+import copy
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class LeaderCancelled(Exception):
+    """The call a follower was waiting on was cancelled by its own caller"""
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution
+
+    The first caller for a key runs the work; callers that arrive while
+    it is in flight await the same future instead of starting their own
+    and get a deep copy of its result, so nobody can mutate another
+    caller's data. If the running caller is cancelled, a waiting caller
+    takes over and runs the work itself. Nothing is cached once the call
+    finishes.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        while key in self._inflight:
+            future = self._inflight[key]
+            self.coalesced += 1
+            try:
+                # Shield so one follower being cancelled doesn't cancel the shared call
+                result = await asyncio.shield(future)
+            except LeaderCancelled:
+                # Run it ourselves, or follow whoever got there first
+                self.coalesced -= 1
+                continue
+            return copy.deepcopy(result)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.calls += 1
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.set_exception(LeaderCancelled())
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+        }
@@ -1,17 +1,158 @@
 import os
+import asyncio
 import aiofiles
+import hashlib
+import logging
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Tuple
 import uuid
 
+# Upload limits
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+
+logger = logging.getLogger(__name__)
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload exceeds the size limit while streaming"""
+
+def _hash_and_write(digest, f, chunk: bytes):
+    # hashlib releases the GIL for large buffers, so this runs well on a thread
+    digest.update(chunk)
+    f.write(chunk)
+
 class StorageService:
-    def __init__(self, base_path: str = "uploads"):
+    """Local image storage
+    
+    With ``content_addressed`` enabled every image is stored once as a
+    blob under ``blobs/<aa>/<bb>/<sha256>`` and each analysis gets a hard
+    link ``<analysis_id>/<sha256><ext>`` to it. The blob's link count is
+    its reference count: deleting the last analysis that uses it frees
+    the blob, and re-uploading the same photo costs no extra disk space.
+    Checking a blob's link count and linking to it happen under one lock,
+    so a purge on a worker thread can't free a blob an upload is about to
+    link; another process doing so makes the link fail, and it is retried.
+    On a filesystem without hard links content addressing is turned off.
+    """
+    
+    def __init__(self, base_path: str = "uploads", content_addressed: bool = False):
         self.base_path = Path(base_path)
         self.base_path.mkdir(exist_ok=True)
+        self.content_addressed = content_addressed
+        self.blob_path = self.base_path / "blobs"
+        self._blob_lock = threading.RLock()
+        
+        # Dedup counters for content-addressed mode
+        self.dedup_hits = 0
+        self.bytes_deduplicated = 0
+        
+        if content_addressed:
+            (self.blob_path / "tmp").mkdir(parents=True, exist_ok=True)
+            if not self._hard_links_supported():
+                logger.warning("No hard links under %s, storing every upload separately", self.base_path)
+                self.content_addressed = False
+    
+    def _hard_links_supported(self) -> bool:
+        probe = self.blob_path / "tmp" / f"{uuid.uuid4().hex}.probe"
+        probe.touch()
+        try:
+            os.link(probe, probe.with_suffix(".link"))
+            os.remove(probe.with_suffix(".link"))
+            return True
+        except OSError:
+            return False
+        finally:
+            os.remove(probe)
+    
+    def _blob_for(self, content_hash: str) -> Path:
+        """Fan-out location of a blob so no directory grows too large"""
+        return self.blob_path / content_hash[:2] / content_hash[2:4] / content_hash
+    
+    def _link_blob(self, analysis_id: str, filename: str, content_hash: str, size: int, staged: Optional[Path]) -> str:
+        """Make the analysis reference a blob, creating the blob from ``staged`` if needed"""
+        
+        analysis_dir = self.base_path / analysis_id
+        analysis_dir.mkdir(exist_ok=True)
+        file_extension = Path(filename).suffix or '.jpg'
+        file_path = analysis_dir / f"{content_hash}{file_extension}"
+        blob = self._blob_for(content_hash)
+        
+        try:
+            with self._blob_lock:
+                for attempt in range(2):
+                    deduplicated = blob.exists()
+                    if not deduplicated:
+                        if staged is None:
+                            raise FileNotFoundError(blob)
+                        blob.parent.mkdir(parents=True, exist_ok=True)
+                        os.replace(staged, blob)
+                        staged = None
+                    
+                    if file_path.exists():
+                        break
+                    try:
+                        os.link(blob, file_path)
+                        break
+                    except FileNotFoundError:
+                        # Another process freed the blob after the check
+                        if attempt:
+                            raise
+                    except OSError:
+                        # Out of links for this blob: keep a private copy, and
+                        # the blob so later uploads still deduplicate against it
+                        with open(blob, 'rb') as src, open(file_path, 'wb') as dst:
+                            dst.write(src.read())
+                        break
+                if deduplicated:
+                    self.dedup_hits += 1
+                    self.bytes_deduplicated += size
+        finally:
+            if staged is not None:
+                try:
+                    os.remove(staged)
+                except FileNotFoundError:
+                    pass
+        
+        return str(file_path)
+    
+    def _release_blob(self, content_hash: str):
+        """Free a blob once no analysis links to it any more"""
+        
+        blob = self._blob_for(content_hash)
+        with self._blob_lock:
+            try:
+                if os.stat(blob).st_nlink <= 1:
+                    os.remove(blob)
+            except FileNotFoundError:
+                pass
+    
+    def blob_hash(self, file_path: Path) -> Optional[str]:
+        """Return the blob hash an analysis file links to, if any"""
+        
+        stem = file_path.stem
+        if self.content_addressed and len(stem) == 64 and all(c in "0123456789abcdef" for c in stem):
+            return stem
+        return None
     
     async def save_image(self, analysis_id: str, filename: str, content: bytes) -> str:
         """Save uploaded image to local storage"""
         
+        if self.content_addressed:
+            content_hash = await asyncio.to_thread(lambda: hashlib.sha256(content).hexdigest())
+            if self._blob_for(content_hash).exists():
+                # Already stored: no write at all
+                try:
+                    return await asyncio.to_thread(
+                        self._link_blob, analysis_id, filename, content_hash, len(content), None
+                    )
+                except FileNotFoundError:
+                    pass  # Freed since the check; store it again
+            staged = self.blob_path / "tmp" / f"{uuid.uuid4().hex}.part"
+            async with aiofiles.open(staged, 'wb') as f:
+                await f.write(content)
+            return await asyncio.to_thread(self._link_blob, analysis_id, filename, content_hash, len(content), staged)
+        
         # Create directory for this analysis
         analysis_dir = self.base_path / analysis_id
         analysis_dir.mkdir(exist_ok=True)
@@ -27,6 +168,68 @@ class StorageService:
         
         return str(file_path)
     
+    async def save_upload(
+        self,
+        analysis_id: str,
+        filename: str,
+        upload,
+        max_size: int = MAX_IMAGE_SIZE,
+        chunk_size: int = CHUNK_SIZE,
+    ) -> Tuple[str, str, int]:
+        """Stream an upload to local storage in a single pass
+        
+        ``upload`` is anything with an async ``read(size)``, such as a
+        FastAPI ``UploadFile``. Only one chunk is held in memory at a time,
+        the SHA-256 is computed as data arrives and the partial file is
+        removed as soon as ``max_size`` is exceeded. Hashing, writing and
+        linking run on worker threads.
+        
+        Returns (file_path, sha256 hex digest, size in bytes).
+        """
+        
+        file_extension = Path(filename).suffix or '.jpg'
+        unique_filename = f"{uuid.uuid4().hex}{file_extension}"
+        if self.content_addressed:
+            # Stage next to the blobs; the final name depends on the hash
+            file_path = None
+            part_path = self.blob_path / "tmp" / f"{unique_filename}.part"
+        else:
+            analysis_dir = self.base_path / analysis_id
+            analysis_dir.mkdir(exist_ok=True)
+            file_path = analysis_dir / unique_filename
+            part_path = file_path.with_name(unique_filename + ".part")
+        
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            f = await asyncio.to_thread(open, part_path, 'wb')
+            try:
+                while True:
+                    chunk = await upload.read(chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_size:
+                        raise ImageTooLargeError(f"Image exceeds {max_size} bytes")
+                    await asyncio.to_thread(_hash_and_write, digest, f, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+            if file_path is None:
+                content_hash = digest.hexdigest()
+                file_path = await asyncio.to_thread(
+                    self._link_blob, analysis_id, filename, content_hash, size, part_path
+                )
+                return file_path, content_hash, size
+            await asyncio.to_thread(os.replace, part_path, file_path)
+        except BaseException:
+            try:
+                os.remove(part_path)
+            except FileNotFoundError:
+                pass
+            raise
+        
+        return str(file_path), digest.hexdigest(), size
+    
     async def get_image(self, file_path: str) -> Optional[bytes]:
         """Retrieve image from storage"""
         
@@ -41,9 +244,13 @@ class StorageService:
         
         try:
             os.remove(file_path)
-            return True
         except FileNotFoundError:
             return False
+        
+        content_hash = self.blob_hash(Path(file_path))
+        if content_hash:
+            self._release_blob(content_hash)
+        return True
     
     async def delete_analysis_images(self, analysis_id: str) -> bool:
         """Delete all images for an analysis"""
@@ -58,6 +265,9 @@ class StorageService:
             for file_path in analysis_dir.iterdir():
                 if file_path.is_file():
                     file_path.unlink()
+                    content_hash = self.blob_hash(file_path)
+                    if content_hash:
+                        self._release_blob(content_hash)
             
             # Remove the directory
             analysis_dir.rmdir()
@@ -65,9 +275,48 @@ class StorageService:
         except Exception:
             return False
     
-    def get_image_url(self, file_path: str, base_url: str = "http://localhost:8000") -> str:
-        """Generate URL for accessing stored image"""
+    def purge_analysis(self, analysis_id: str, image_paths: List[str]) -> int:
+        """Remove an analysis's images and directory, returning the bytes actually freed
+        
+        Blocking; run it off the event loop. A content-addressed image only
+        frees space when its last link goes.
+        """
+        
+        analysis_dir = self.base_path / analysis_id
+        paths = {Path(path) for path in image_paths}
+        if analysis_dir.is_dir():
+            paths.update(path for path in analysis_dir.iterdir() if path.is_file())
+        
+        freed = 0
+        for file_path in paths:
+            try:
+                stat_result = os.stat(file_path)
+                os.remove(file_path)
+            except FileNotFoundError:
+                continue
+            content_hash = self.blob_hash(file_path)
+            if content_hash:
+                blob = self._blob_for(content_hash)
+                with self._blob_lock:
+                    try:
+                        if os.stat(blob).st_nlink <= 1:
+                            os.remove(blob)
+                            freed += stat_result.st_size
+                    except FileNotFoundError:
+                        pass
+            elif stat_result.st_nlink <= 1:
+                freed += stat_result.st_size
+        
+        try:
+            analysis_dir.rmdir()
+        except OSError:
+            pass
+        return freed
+    
+    def get_image_url(self, file_path: str, base_url: str = "http://localhost:8000", size: Optional[int] = None) -> str:
+        """Generate URL for accessing stored image, or a thumbnail of it with ``size``"""
         
         # Convert absolute path to relative path from base_path
         relative_path = Path(file_path).relative_to(self.base_path)
-        return f"{base_url}/uploads/{relative_path}"
\ No newline at end of file
+        url = f"{base_url}/uploads/{relative_path.as_posix()}"
+        return f"{url}?size={size}" if size else url
\ No newline at end of file
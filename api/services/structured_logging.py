@@ -0,0 +1,178 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import reprlib
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+# Correlation IDs, set per HTTP request and per analysis run
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+analysis_id_var: ContextVar[Optional[str]] = ContextVar("analysis_id", default=None)
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_payload_repr = reprlib.Repr()
+_payload_repr.maxlevel = 3
+_payload_repr.maxdict = 12
+_payload_repr.maxlist = 8
+_payload_repr.maxstring = 120
+_payload_repr.maxother = 120
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def payload(value: Any, sample_rate: Optional[float] = None) -> Optional[str]:
+    """Bounded-size repr of a record or result for logging, or None if not sampled
+
+    reprlib stops walking after a few items, so the cost doesn't grow with
+    the payload. Call it only under ``logger.isEnabledFor(...)``.
+    """
+
+    rate = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", "0.1")) if sample_rate is None else sample_rate
+    if rate < 1.0 and random.random() >= rate:
+        return None
+    return _payload_repr.repr(value)
+
+
+class CorrelationFilter(logging.Filter):
+    """Stamp records with the current request and analysis IDs"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        if getattr(record, "analysis_id", None) is None:
+            record.analysis_id = analysis_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with ``extra`` fields at the top level"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread
+
+    The stock handler formats and copies the record in the caller; here
+    it is passed on as is (this is the only handler on these loggers).
+    Arguments must therefore not be mutated after logging, which holds
+    for the strings and payload() snapshots used in this app.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            # Tracebacks hold frames; render them now and drop the references
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        ids = " ".join(
+            f"{key}={value}" for key, value in
+            (("request_id", getattr(record, "request_id", None)), ("analysis_id", getattr(record, "analysis_id", None)))
+            if value
+        )
+        line = f"{self.formatTime(record)} {record.levelname} {record.name}: {record.getMessage()}"
+        if ids:
+            line += f" [{ids}]"
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None, stream=None):
+    """Route the ``api`` and ``worker`` loggers through a queue to a background writer
+
+    LOG_LEVEL (default INFO) and LOG_FORMAT (``text`` or ``json``) configure
+    it. Safe to call more than once; later calls are ignored.
+    """
+
+    global _listener
+    if _listener is not None:
+        return
+
+    level = (level or os.environ.get("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.environ.get("LOG_FORMAT", "text")).lower()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == "json" else _TextFormatter())
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = _DeferredQueueHandler(log_queue)
+    handler.addFilter(CorrelationFilter())
+
+    for name in ("api", "worker"):
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        logger.addHandler(handler)
+        logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class CorrelationIdMiddleware:
+    """ASGI middleware giving every request an ID, echoed as X-Request-ID
+
+    A plain ASGI wrapper rather than BaseHTTPMiddleware, so it adds no
+    extra task per request and leaves streaming responses untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        header = (b"x-request-id", request_id.encode("latin-1"))
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [header]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
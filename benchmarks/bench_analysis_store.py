@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark the SQLite analysis store at 10k, 100k and 1M stored analyses
+
+Usage: python benchmarks/bench_analysis_store.py [--sizes 10000 100000 1000000]
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add the repository root to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from api.services.analysis_store import SQLiteAnalysisStore
+
+USERS = 1000
+
+
+def make_record(i: int, base: datetime) -> dict:
+    return {
+        "analysis_id": str(uuid.uuid4()),
+        "user_id": f"user_{i % USERS}",
+        "status": "completed",
+        "image_paths": [f"uploads/x/{i}.jpg"],
+        "created_at": (base + timedelta(seconds=i)).isoformat(),
+        "estimated_time": 30,
+        "item_info": {"name": "Educational Book", "series": "Academic", "year": "2023", "condition": "Good"},
+        "price_range": {"min": 280, "max": 450, "currency": "THB", "suggested": 365},
+        "confidence": 85,
+        "market_data": [],
+    }
+
+
+def timed(samples):
+    samples.sort()
+    return sum(samples) / len(samples) * 1e6, samples[int(len(samples) * 0.99) - 1] * 1e6
+
+
+async def bench(size: int, db_path: str):
+    store = SQLiteAnalysisStore(db_path=db_path, batch_size=5000, cache_size=1024)
+    base = datetime(2024, 1, 1)
+    ids = []
+
+    start = time.perf_counter()
+    for i in range(size):
+        record = make_record(i, base)
+        ids.append(record["analysis_id"])
+        await store.put(record)
+    await store.flush()
+    load_time = time.perf_counter() - start
+
+    # History lookups for random users
+    history = []
+    for _ in range(500):
+        user_id = f"user_{random.randrange(USERS)}"
+        t0 = time.perf_counter()
+        await store.list_by_user(user_id, offset=0, limit=20)
+        history.append(time.perf_counter() - t0)
+
+    # Status polls of an in-flight analysis
+    live = make_record(size, base)
+    live["status"] = "processing"
+    await store.put(live)
+    polls = []
+    for _ in range(10000):
+        t0 = time.perf_counter()
+        await store.get(live["analysis_id"])
+        polls.append(time.perf_counter() - t0)
+
+    # Cold reads of finished analyses
+    cold = []
+    for analysis_id in random.sample(ids, 500):
+        t0 = time.perf_counter()
+        await store.get(analysis_id)
+        cold.append(time.perf_counter() - t0)
+
+    await store.close()
+
+    # Records survive a restart
+    t0 = time.perf_counter()
+    reopened = SQLiteAnalysisStore(db_path=db_path)
+    survived = await reopened.get(live["analysis_id"]) is not None
+    reopen_time = time.perf_counter() - t0
+    await reopened.close()
+
+    print(f"\n📦 {size:,} analyses")
+    print(f"  Load:            {load_time:.2f}s ({size / load_time:,.0f} writes/s)")
+    print("  History page:    avg {:.1f}µs, p99 {:.1f}µs".format(*timed(history)))
+    print("  Status poll:     avg {:.2f}µs, p99 {:.2f}µs".format(*timed(polls)))
+    print("  Cold get:        avg {:.1f}µs, p99 {:.1f}µs".format(*timed(cold)))
+    print(f"  Restart:         {reopen_time * 1000:.1f}ms, record survived: {survived}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print("🧪 Analysis store benchmark")
+    print("=" * 60)
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            await bench(size, str(Path(tmp) / "analyses.db"))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
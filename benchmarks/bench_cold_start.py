@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Cold start: time to first request and memory per worker for each launch mode
+
+  single    one `uvicorn api.main:app` process (the old way, minus reload)
+  workers   start_backend.py --production --no-preload: forked workers
+            that each import everything themselves
+  preload   start_backend.py --production: dependencies imported once in
+            the parent, workers forked from it
+
+Each launch is timed from process start until GET / answers. After a
+short warm-up, RSS and PSS (RSS with shared pages split between the
+processes sharing them) are read from /proc for every process in the
+tree, so the total shows what the preloaded pages save. Linux only.
+
+Usage: python benchmarks/bench_cold_start.py [--workers 4] [--runs 3] [--modes single,workers,preload]
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).parent.parent
+
+
+def read_kb(path: str, field: str) -> int:
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def process_tree(pid: int):
+    """pid and all its descendants"""
+    pids = [pid]
+    for current in pids:
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def memory(pid: int):
+    return {
+        "rss_mb": read_kb(f"/proc/{pid}/status", "VmRSS") / 1024,
+        "pss_mb": read_kb(f"/proc/{pid}/smaps_rollup", "Pss") / 1024,
+    }
+
+
+def command(mode: str, port: int, workers: int):
+    if mode == "single":
+        return [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--log-level", "warning"]
+    launcher = [sys.executable, str(ROOT / "start_backend.py"), "--production", "--host", "127.0.0.1",
+                "--port", str(port), "--workers", str(workers), "--log-level", "warning"]
+    return launcher + (["--no-preload"] if mode == "workers" else [])
+
+
+async def launch(mode: str, args, workdir: Path):
+    url = f"http://127.0.0.1:{args.port}/"
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(ROOT),
+        "ANALYSIS_DB_PATH": str(workdir / "analyses.db"),
+        "SEARCH_CACHE_PATH": str(workdir / "search_cache.db"),
+        "LOG_LEVEL": "WARNING",
+        # Required by the launcher for more than one worker
+        "ANALYSIS_EXECUTOR": "durable",
+        "ANALYSIS_QUEUE_PATH": str(workdir / "jobs.db"),
+    }
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        command(mode, args.port, args.workers), cwd=workdir, env=env, start_new_session=True,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        async with httpx.AsyncClient() as client:
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"{mode} exited with status {process.returncode}")
+                try:
+                    if (await client.get(url, timeout=1)).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.01)
+            first_request = time.perf_counter() - started
+
+            # Let the remaining workers come up, then touch them all
+            await asyncio.sleep(args.settle)
+            await asyncio.gather(*(client.get(url) for _ in range(args.workers * 50)))
+
+        pids = process_tree(process.pid)
+        workers = pids[1:] if mode != "single" else pids
+        usage = {pid: memory(pid) for pid in pids}
+        return {
+            "first_request_s": first_request,
+            "workers": len(workers),
+            "worker_rss_mb": statistics.mean(usage[pid]["rss_mb"] for pid in workers),
+            "worker_pss_mb": statistics.mean(usage[pid]["pss_mb"] for pid in workers),
+            "total_pss_mb": sum(item["pss_mb"] for item in usage.values()),
+        }
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--modes", default="single,workers,preload")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds to wait for all workers after the first answer")
+    args = parser.parse_args()
+
+    if not Path("/proc/self/smaps_rollup").exists():
+        print("This benchmark reads /proc and needs Linux")
+        sys.exit(1)
+
+    print(f"🧪 Cold start, {args.workers} workers, best of {args.runs} runs")
+    print("=" * 60)
+    print(f"  {'mode':<9} {'first req':>10} {'workers':>8} {'RSS/worker':>11} {'PSS/worker':>11} {'total PSS':>10}")
+    for mode in args.modes.split(","):
+        runs = []
+        for _ in range(args.runs):
+            with tempfile.TemporaryDirectory(prefix="bench_cold_start_") as workdir:
+                runs.append(await launch(mode, args, Path(workdir)))
+        best = min(runs, key=lambda run: run["first_request_s"])
+        print(f"  {mode:<9} {best['first_request_s']:9.2f}s {best['workers']:8d} "
+              f"{best['worker_rss_mb']:9.1f}MB {best['worker_pss_mb']:9.1f}MB {best['total_pss_mb']:8.1f}MB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
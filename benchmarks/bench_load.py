@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test: upload-then-poll traffic against a real API process
+
+Starts benchmarks/stub_upstreams.py and `uvicorn api.main:app` in a
+scratch directory, points the API at the stubs, then runs --users
+concurrent clients that each upload 1-3 photos and poll until their
+analysis finishes. Reports throughput and p50/p95/p99 latency per
+endpoint, end to end, and per pipeline stage (from /metrics), and writes
+everything to a JSON file. Pass --compare to diff against an earlier run.
+
+Usage: python benchmarks/bench_load.py [--users 20] [--analyses 200] [--output results.json] [--compare old.json]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).parent.parent
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    index = (len(values) - 1) * q / 100
+    low = int(index)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (index - low)
+
+
+def summarize(latencies, errors, elapsed):
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+        **{f"p{q}_ms": round(percentile(latencies, q) * 1000, 2) if latencies else None for q in (50, 95, 99)},
+    }
+
+
+def make_photo(rng: random.Random, size=(1600, 1200)) -> bytes:
+    """A distinct, JPEG-compressible photo stand-in"""
+    image = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.ellipse(
+            (x, y, x + rng.randrange(50, 400), y + rng.randrange(50, 400)),
+            fill=tuple(rng.randrange(256) for _ in range(3)),
+        )
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+_SAMPLE = re.compile(r'^(\w+)(?:\{([^}]*)\})? (\S+)$')
+
+
+def parse_histograms(text, name):
+    """{label_value: [(le, cumulative_count), ...]} for one histogram in Prometheus text"""
+    histograms = {}
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if not match or match.group(1) != f"{name}_bucket":
+            continue
+        labels = dict(re.findall(r'(\w+)="([^"]*)"', match.group(2) or ""))
+        bound = float("inf") if labels["le"] == "+Inf" else float(labels["le"])
+        key = next(value for label, value in labels.items() if label != "le")
+        histograms.setdefault(key, []).append((bound, float(match.group(3))))
+    return histograms
+
+
+def histogram_quantile(buckets, q):
+    """Prometheus-style linear interpolation inside the bucket holding quantile q"""
+    buckets = sorted(buckets)
+    total = buckets[-1][1]
+    if total == 0:
+        return None
+    rank = q * total
+    previous_bound, previous_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if bound == float("inf"):
+                return previous_bound
+            return previous_bound + (bound - previous_bound) * (rank - previous_count) / max(count - previous_count, 1e-9)
+        previous_bound, previous_count = bound, count
+    return previous_bound
+
+
+def stage_summary(before, after):
+    """Per-stage count and quantiles for observations made during the run"""
+    stages = {}
+    for stage, buckets in after.items():
+        earlier = dict(before.get(stage, []))
+        delta = [(bound, count - earlier.get(bound, 0)) for bound, count in buckets]
+        count = max(c for _, c in delta)
+        if count == 0:
+            continue
+        stages[stage] = {
+            "count": int(count),
+            **{f"p{q}_ms": round(histogram_quantile(delta, q / 100) * 1000, 2) for q in (50, 95, 99)},
+        }
+    return stages
+
+
+async def wait_until_up(url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+async def run_load(api_url, args):
+    endpoint_latencies = {"POST /api/analyze": [], "GET /api/analysis/{id}": []}
+    endpoint_errors = {name: 0 for name in endpoint_latencies}
+    end_to_end = []
+    outcomes = {}
+    rng = random.Random(args.seed)
+    photos = [make_photo(rng) for _ in range(args.photo_pool)]
+    remaining = args.analyses
+
+    limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+    async with httpx.AsyncClient(base_url=api_url, timeout=120, limits=limits) as client:
+
+        async def user(user_index):
+            nonlocal remaining
+            user_rng = random.Random(args.seed * 1000 + user_index)
+            while remaining > 0:
+                remaining -= 1
+                files = [
+                    ("images", (f"photo_{i}.jpg", user_rng.choice(photos), "image/jpeg"))
+                    for i in range(user_rng.randint(1, 3))
+                ]
+                started = time.perf_counter()
+                response = await client.post("/api/analyze", params={"user_id": f"load-{user_index}"}, files=files)
+                endpoint_latencies["POST /api/analyze"].append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    endpoint_errors["POST /api/analyze"] += 1
+                    outcomes[f"http_{response.status_code}"] = outcomes.get(f"http_{response.status_code}", 0) + 1
+                    await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+                    continue
+                analysis_id = response.json()["analysis_id"]
+
+                while True:
+                    poll_started = time.perf_counter()
+                    params = {"wait": args.long_poll} if args.long_poll else None
+                    poll = await client.get(f"/api/analysis/{analysis_id}", params=params)
+                    if not args.long_poll:
+                        endpoint_latencies["GET /api/analysis/{id}"].append(time.perf_counter() - poll_started)
+                    if poll.status_code != 200:
+                        endpoint_errors["GET /api/analysis/{id}"] += 1
+                        break
+                    status = poll.json()["status"]
+                    if status in ("completed", "error"):
+                        end_to_end.append(time.perf_counter() - started)
+                        outcomes[status] = outcomes.get(status, 0) + 1
+                        break
+                    if not args.long_poll:
+                        await asyncio.sleep(args.poll_interval)
+
+        metrics_before = (await client.get("/metrics")).text
+        started = time.perf_counter()
+        await asyncio.gather(*(user(i) for i in range(args.users)))
+        elapsed = time.perf_counter() - started
+        metrics_after = (await client.get("/metrics")).text
+
+    name = "analysis_stage_seconds"
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "outcomes": outcomes,
+        "endpoints": {
+            endpoint: summarize(latencies, endpoint_errors[endpoint], elapsed)
+            for endpoint, latencies in endpoint_latencies.items()
+            if latencies or endpoint_errors[endpoint]
+        },
+        "end_to_end": summarize(end_to_end, 0, elapsed),
+        "stages": stage_summary(parse_histograms(metrics_before, name), parse_histograms(metrics_after, name)),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous_path):
+    previous = json.loads(Path(previous_path).read_text())
+    print(f"\n📊 Compared with {previous_path} ({previous['meta'].get('commit')})")
+
+    def rows(section):
+        for name, stats in current.get(section, {}).items():
+            old = previous.get(section, {}).get(name)
+            if not old:
+                continue
+            for key in ("throughput", "p50_ms", "p95_ms", "p99_ms"):
+                if stats.get(key) is None or old.get(key) in (None, 0):
+                    continue
+                change = (stats[key] - old[key]) / old[key] * 100
+                label = f"{section}/{name}"
+                print(f"  {label:<40} {key:<10} {old[key]:>10.2f} -> {stats[key]:>10.2f}  ({change:+.1f}%)")
+
+    rows("endpoints")
+    rows("stages")
+    old_e2e, new_e2e = previous.get("end_to_end", {}), current["end_to_end"]
+    for key in ("throughput", "p50_ms", "p95_ms", "p99_ms"):
+        if new_e2e.get(key) is not None and old_e2e.get(key):
+            change = (new_e2e[key] - old_e2e[key]) / old_e2e[key] * 100
+            print(f"  {'end_to_end':<40} {key:<10} {old_e2e[key]:>10.2f} -> {new_e2e[key]:>10.2f}  ({change:+.1f}%)")
+
+
+def print_report(results):
+    print(f"  finished in {results['elapsed_s']}s, outcomes {results['outcomes']}")
+    header = f"  {'':<30} {'count':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header)
+    for name, stats in list(results["endpoints"].items()) + [("end to end", results["end_to_end"])]:
+        print(f"  {name:<30} {stats['count']:>7} {stats['throughput'] or 0:>8.1f} "
+              f"{stats['p50_ms'] or 0:>9.1f} {stats['p95_ms'] or 0:>9.1f} {stats['p99_ms'] or 0:>9.1f}")
+    print("  stages (from /metrics)")
+    for name, stats in results["stages"].items():
+        print(f"    {name:<28} {stats['count']:>7} {'':>8} "
+              f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="concurrent clients")
+    parser.add_argument("--analyses", type=int, default=200, help="total analyses to run")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--long-poll", type=float, default=0, help="use ?wait=N instead of fixed-interval polling")
+    parser.add_argument("--photo-pool", type=int, default=400, help="distinct photos; smaller pools mean more cache hits")
+    parser.add_argument("--ark-latency-ms", type=float, default=1500)
+    parser.add_argument("--serpapi-latency-ms", type=float, default=600)
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.01)
+    parser.add_argument("--api-port", type=int, default=8765)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the API process, e.g. ANALYSIS_WORKERS=8")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/load-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    output = Path(args.output or ROOT / "benchmarks" / "results" / f"load-{commit or 'local'}.json")
+    workdir = Path(tempfile.mkdtemp(prefix="bench_load_"))
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    api_url = f"http://127.0.0.1:{args.api_port}"
+
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(ROOT),
+        "ARK_BASE_URL": f"{stub_url}/ark",
+        "SERPAPI_BASE_URL": f"{stub_url}/serpapi",
+        "ARK_API_KEY": "stub",
+        "SERPAPI_API_KEY": "stub",
+        "ANALYSIS_DB_PATH": str(workdir / "analyses.db"),
+        "SEARCH_CACHE_PATH": str(workdir / "search_cache.db"),
+        "LOG_LEVEL": "WARNING",
+    }
+    env.update(item.split("=", 1) for item in args.env)
+
+    stub = subprocess.Popen([
+        sys.executable, str(ROOT / "benchmarks" / "stub_upstreams.py"), "--port", str(args.stub_port),
+        "--ark-latency-ms", str(args.ark_latency_ms), "--serpapi-latency-ms", str(args.serpapi_latency_ms),
+        "--error-rate", str(args.error_rate), "--rate-limit-rate", str(args.rate_limit_rate),
+        "--seed", str(args.seed),
+    ])
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(args.api_port), "--log-level", "warning"],
+        cwd=workdir, env=env,
+    )
+    try:
+        await wait_until_up(f"{stub_url}/stats")
+        await wait_until_up(f"{api_url}/")
+
+        print(f"🧪 {args.analyses} analyses from {args.users} users "
+              f"(ark ~{args.ark_latency_ms:.0f}ms, serpapi ~{args.serpapi_latency_ms:.0f}ms, "
+              f"{args.error_rate:.0%} 5xx, {args.rate_limit_rate:.0%} 429)")
+        print("=" * 60)
+        results = await run_load(api_url, args)
+        async with httpx.AsyncClient() as client:
+            upstream = (await client.get(f"{stub_url}/stats")).json()
+    finally:
+        api.terminate()
+        stub.terminate()
+        api.wait()
+        stub.wait()
+
+    results = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+            "upstream": upstream,
+        },
+        **results,
+    }
+    print_report(results)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"\n💾 Results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
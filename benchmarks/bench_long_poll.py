@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Compare long-polling GET /api/analysis/{id}?wait=... with plain polling
+
+N clients each wait for their analysis to finish; the analyses complete
+after a fixed delay. Requests go through the app in-process
+(httpx.ASGITransport), so routing, headers and serialization count. Reports requests served, time from completion to
+the client noticing, and memory held by parked waiters.
+
+Usage: python benchmarks/bench_long_poll.py [--clients 20000] [--interval 2]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+os.environ.setdefault("ANALYSIS_STORE", "memory")
+
+# Add the repository root to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import api.main as main_module
+
+
+async def seed(count: int):
+    ids = []
+    for _ in range(count):
+        analysis_id = str(uuid.uuid4())
+        await main_module.analysis_store.put({
+            "analysis_id": analysis_id,
+            "user_id": "bench",
+            "status": "processing",
+            "image_paths": [],
+            "created_at": datetime.now().isoformat(),
+        })
+        ids.append(analysis_id)
+    return ids
+
+
+async def finish(ids):
+    done_at = time.perf_counter()
+    for analysis_id in ids:
+        await main_module._update_analysis(analysis_id, {"status": "error", "error_message": "bench"})
+    return done_at
+
+
+def app_client() -> httpx.AsyncClient:
+    transport = httpx.ASGITransport(app=main_module.app)
+    return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None)
+
+
+async def status_of(client: httpx.AsyncClient, analysis_id: str, **params) -> str:
+    response = await client.get(f"/api/analysis/{analysis_id}", params=params)
+    response.raise_for_status()
+    return response.json()["status"]
+
+
+async def run_polling(http: httpx.AsyncClient, clients: int, interval: float, delay: float):
+    ids = await seed(clients)
+    requests = 0
+    noticed = []
+
+    async def client(analysis_id):
+        nonlocal requests
+        while True:
+            requests += 1
+            if await status_of(http, analysis_id) == "error":
+                noticed.append(time.perf_counter())
+                return
+            await asyncio.sleep(interval)
+
+    tasks = [asyncio.create_task(client(i)) for i in ids]
+    await asyncio.sleep(delay)
+    done_at = await finish(ids)
+    await asyncio.gather(*tasks)
+    return requests, [n - done_at for n in noticed], None
+
+
+async def run_long_poll(http: httpx.AsyncClient, clients: int, delay: float):
+    ids = await seed(clients)
+    requests = 0
+    noticed = []
+
+    async def client(analysis_id):
+        nonlocal requests
+        while True:
+            requests += 1
+            if await status_of(http, analysis_id, wait=30) == "error":
+                noticed.append(time.perf_counter())
+                return
+
+    tracemalloc.start()
+    tasks = [asyncio.create_task(client(i)) for i in ids]
+    await asyncio.sleep(delay)
+    parked, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    waiters = main_module.event_bus.waiter_count()
+    done_at = await finish(ids)
+    await asyncio.gather(*tasks)
+    return requests, [n - done_at for n in noticed], (parked, waiters)
+
+
+def report(name, requests, latencies, clients):
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"  {name:<10} {requests:>8,} requests ({requests / clients:.1f}/client)  "
+          f"notice latency p50 {p50:8.1f}ms  p99 {p99:8.1f}ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=20000)
+    parser.add_argument("--interval", type=float, default=2.0, help="plain polling interval")
+    parser.add_argument("--delay", type=float, default=5.0, help="seconds until analyses finish")
+    args = parser.parse_args()
+
+    print(f"🧪 {args.clients:,} clients, analyses finish after {args.delay}s")
+    print("=" * 60)
+    with contextlib.redirect_stdout(io.StringIO()):
+        async with app_client() as http:
+            polling = await run_polling(http, args.clients, args.interval, args.delay)
+            long_poll = await run_long_poll(http, args.clients, args.delay)
+
+    report("polling", polling[0], polling[1], args.clients)
+    report("long-poll", long_poll[0], long_poll[1], args.clients)
+    parked, waiters = long_poll[2]
+    print(f"  {waiters:,} parked waiters held {parked / (1024 * 1024):.1f} MB "
+          f"({parked / max(1, waiters):.0f} bytes each, including the client request)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
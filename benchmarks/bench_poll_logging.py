@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Poll-endpoint throughput with the old print() debugging vs structured logging
+
+Drives GET /api/analysis/{id} through the full ASGI stack (middleware
+included) for a completed analysis and reports requests per second:
+
+  print        the previous behaviour, two synchronous stdout prints of
+               the whole record and result per poll
+  logging      structured logging at the default INFO level
+  debug        structured logging at DEBUG, with truncated payloads
+               formatted and written by the background listener
+
+Output of every mode goes to a real file so write costs are included.
+
+Usage: python benchmarks/bench_poll_logging.py [--requests 20000] [--concurrency 50]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+os.environ.setdefault("ANALYSIS_STORE", "memory")
+
+# Add the repository root to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from api.services.structured_logging import setup_logging
+
+log_file = tempfile.NamedTemporaryFile("w", suffix=".log", delete=False)
+setup_logging(stream=log_file)
+
+import api.main as main_module
+
+
+def completed_record() -> dict:
+    return {
+        "analysis_id": str(uuid.uuid4()),
+        "user_id": "bench",
+        "status": "completed",
+        "image_paths": [f"uploads/bench/image_{i}.jpg" for i in range(3)],
+        "image_hashes": [uuid.uuid4().hex * 2 for _ in range(3)],
+        "created_at": datetime.now().isoformat(),
+        "completed_at": datetime.now().isoformat(),
+        "item_info": {"name": "iPhone 12 Pro", "series": "iPhone 12", "year": "2020", "condition": "Good"},
+        "price_range": {"min": 12500, "max": 15900, "currency": "THB", "suggested": 13900},
+        "confidence": 85,
+        "market_data": [
+            {
+                "title": f"iPhone 12 Pro มือสอง สภาพดี ประกันเหลือ listing {i}",
+                "price": f"{13000 + i * 500:,} ฿",
+                "source": "Facebook Marketplace",
+                "url": f"https://example.com/listing/{i}",
+            }
+            for i in range(5)
+        ],
+        "image_quality": {
+            "best_index": 1,
+            "scores": [{"score": 0.8, "sharpness": 0.9, "exposure": 0.7, "resolution": 1.0} for _ in range(3)],
+        },
+    }
+
+
+@contextlib.contextmanager
+def legacy_prints():
+    """Reinstate the print() calls get_analysis used to make on every poll"""
+
+    original = main_module._to_result
+
+    def to_result(analysis):
+        print(f"DEBUG: Getting analysis {analysis['analysis_id']}, current data: {analysis}")
+        result = original(analysis)
+        print(f"DEBUG: Returning {analysis['status']} analysis: {result}")
+        return result
+
+    main_module._to_result = to_result
+    with open(log_file.name, "a") as stdout, contextlib.redirect_stdout(stdout):
+        try:
+            yield
+        finally:
+            main_module._to_result = original
+
+
+async def hammer(analysis_id: str, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=main_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        remaining = requests
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                response = await client.get(f"/api/analysis/{analysis_id}")
+                assert response.status_code == 200
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    record = completed_record()
+    await main_module.analysis_store.put(record)
+    api_logger = logging.getLogger("api")
+
+    print(f"🧪 {args.requests:,} polls of a completed analysis, concurrency {args.concurrency}")
+    print("=" * 60)
+
+    # Warm up imports, routing and the store
+    await hammer(record["analysis_id"], 500, args.concurrency)
+
+    results = {}
+    with legacy_prints():
+        api_logger.setLevel(logging.INFO)
+        results["print"] = await hammer(record["analysis_id"], args.requests, args.concurrency)
+
+    api_logger.setLevel(logging.INFO)
+    results["logging"] = await hammer(record["analysis_id"], args.requests, args.concurrency)
+
+    api_logger.setLevel(logging.DEBUG)
+    results["debug"] = await hammer(record["analysis_id"], args.requests, args.concurrency)
+    api_logger.setLevel(logging.INFO)
+
+    baseline = results["print"]
+    for mode, rate in results.items():
+        print(f"  {mode:<8} {rate:10,.0f} req/s  ({rate / baseline:4.2f}x)")
+    print(f"📄 log output in {log_file.name}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Compare the old read-twice upload path with the streaming ingest path
+
+Usage: python benchmarks/bench_upload_ingest.py [--concurrency 32] [--size-mb 8]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Add the repository root to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from starlette.datastructures import UploadFile
+
+from api.services.storage_service import StorageService, MAX_IMAGE_SIZE
+
+
+def make_upload(payload: bytes) -> UploadFile:
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spool.write(payload)
+    spool.seek(0)
+    return UploadFile(file=spool, filename="image.jpg")
+
+
+async def old_path(storage: StorageService, analysis_id: str, upload: UploadFile):
+    content = await upload.read()
+    if len(content) > MAX_IMAGE_SIZE:
+        raise ValueError("too large")
+    await upload.seek(0)
+    content = await upload.read()
+    await storage.save_image(analysis_id, "image_0.jpg", content)
+
+
+async def new_path(storage: StorageService, analysis_id: str, upload: UploadFile):
+    await storage.save_upload(analysis_id, "image_0.jpg", upload)
+
+
+async def run(name, handler, storage, payload, concurrency):
+    uploads = [make_upload(payload) for _ in range(concurrency)]
+    tracemalloc.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        handler(storage, f"{name}_{i}", upload) for i, upload in enumerate(uploads)
+    ))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total_mb = len(payload) * concurrency / (1024 * 1024)
+    print(f"  {name:<10} {elapsed:6.2f}s  {total_mb / elapsed:8.1f} MB/s  "
+          f"peak Python heap {peak / (1024 * 1024):7.1f} MB")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--size-mb", type=float, default=8)
+    args = parser.parse_args()
+
+    payload = os.urandom(int(args.size_mb * 1024 * 1024))
+    print(f"🧪 Upload ingest: {args.concurrency} concurrent uploads of {args.size_mb} MB")
+    print("=" * 60)
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = StorageService(base_path=tmp)
+        await run("read-twice", old_path, storage, payload, args.concurrency)
+        await run("streaming", new_path, storage, payload, args.concurrency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
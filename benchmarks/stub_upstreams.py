@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the Ark chat-completions and SerpAPI search endpoints
+
+Responses are deterministic per request (seeded from the query or the
+image bytes) so runs are comparable. Latency is drawn from a lognormal
+distribution around the configured median, and a configurable share of
+requests fail with 429 (with Retry-After) or 5xx.
+
+Point the API at it with:
+  ARK_BASE_URL=http://127.0.0.1:9100/ark SERPAPI_BASE_URL=http://127.0.0.1:9100/serpapi
+
+Usage: python benchmarks/stub_upstreams.py [--port 9100] [--ark-latency-ms 1500] [--error-rate 0.01]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+ITEMS = [
+    ("iPhone 12 Pro", "iPhone 12", "2020", 15900),
+    ("MacBook Air M1", "MacBook Air", "2020", 21900),
+    ("Canon EOS R6", "Canon EOS", "2021", 52000),
+    ("Nintendo Switch OLED", "Nintendo Switch", "2021", 8900),
+    ("Apple Watch Series 7", "Apple Watch", "2021", 8500),
+    ("Programming Book", "Technical Manual", "2022", 350),
+]
+CONDITIONS = ["Excellent", "Good", "Good", "Fair"]
+
+
+class Profile:
+    """Latency and failure behaviour of one stub endpoint"""
+
+    def __init__(self, latency_ms: float, sigma: float, error_rate: float, rate_limit_rate: float):
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.requests = 0
+        self.failures = 0
+
+    async def apply(self):
+        """Sleep like the real service, then maybe return a failure response"""
+        self.requests += 1
+        await asyncio.sleep(random.lognormvariate(0, self.sigma) * self.latency_ms / 1000)
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            self.failures += 1
+            return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": "1"})
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.failures += 1
+            return JSONResponse({"error": "upstream error"}, status_code=503)
+        return None
+
+
+def create_app(ark: Profile, serpapi: Profile) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/ark/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        failure = await ark.apply()
+        if failure is not None:
+            return failure
+        seed = int(hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()[:8], 16)
+        name, series, year, _ = ITEMS[seed % len(ITEMS)]
+        content = json.dumps({"name": name, "series": series, "year": year, "condition": CONDITIONS[seed % len(CONDITIONS)]})
+        prompt_tokens = 700 + seed % 400
+        return {
+            "id": f"stub-{seed:x}",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 40, "total_tokens": prompt_tokens + 40},
+        }
+
+    @app.get("/serpapi/search.json")
+    async def search(q: str = ""):
+        failure = await serpapi.apply()
+        if failure is not None:
+            return failure
+        rng = random.Random(q)
+        base = next((price for name, _, _, price in ITEMS if name.lower() in q.lower()), 1000)
+        results = []
+        for position in range(1, 11):
+            price = round(base * rng.uniform(0.75, 1.2), -1)
+            results.append({
+                "position": position,
+                "title": f"{q.split(' ราคา')[0]} มือสอง สภาพดี {price:,.0f} บาท",
+                "link": f"https://example.com/listing/{rng.getrandbits(32):x}",
+                "snippet": f"ขายด่วน ราคา {price:,.0f} บาท ต่อรองได้",
+            })
+        # An occasional listing far off the market price
+        results.append({"position": 11, "title": f"{q} ราคา {base * 20:,.0f} บาท", "link": "https://example.com/outlier"})
+        return {"search_metadata": {"status": "Success"}, "organic_results": results}
+
+    @app.get("/stats")
+    async def stats():
+        return {
+            name: {"requests": profile.requests, "failures": profile.failures}
+            for name, profile in (("ark", ark), ("serpapi", serpapi))
+        }
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--ark-latency-ms", type=float, default=1500)
+    parser.add_argument("--serpapi-latency-ms", type=float, default=600)
+    parser.add_argument("--latency-sigma", type=float, default=0.35, help="lognormal spread of latencies")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="share of 503 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.01, help="share of 429 responses")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    app = create_app(
+        Profile(args.ark_latency_ms, args.latency_sigma, args.error_rate, args.rate_limit_rate),
+        Profile(args.serpapi_latency_ms, args.latency_sigma, args.error_rate, args.rate_limit_rate),
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
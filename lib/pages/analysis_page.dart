@@ -19,6 +19,7 @@ class _AnalysisPageState extends State<AnalysisPage> {
   bool _isLoading = true;
   String? _error;
   Timer? _pollTimer;
+  StreamSubscription<AnalysisResult>? _statusSubscription;
 
   @override
   void initState() {
@@ -29,6 +30,7 @@ class _AnalysisPageState extends State<AnalysisPage> {
   @override
   void dispose() {
     _pollTimer?.cancel();
+    _statusSubscription?.cancel();
     super.dispose();
   }
 
@@ -46,9 +48,9 @@ class _AnalysisPageState extends State<AnalysisPage> {
         _isLoading = false;
       });
 
-      // If analysis is still processing, start polling
+      // If analysis is still processing, wait for pushed updates
       if (result.status == 'processing' || result.status == 'pending') {
-        _startPolling();
+        _watchAnalysis();
       } else {
         // Analysis is completed or failed, stop any existing polling
         _pollTimer?.cancel();
@@ -62,6 +64,27 @@ class _AnalysisPageState extends State<AnalysisPage> {
     }
   }
 
+  void _watchAnalysis() {
+    _statusSubscription?.cancel();
+    _statusSubscription = _apiService.watchAnalysis(widget.analysisId).listen(
+      (result) {
+        if (mounted) {
+          setState(() {
+            _analysisResult = result;
+          });
+        }
+      },
+      onError: (e) {
+        // Fall back to polling if the event stream is unavailable
+        print('Status stream error: $e');
+        if (mounted) {
+          _startPolling();
+        }
+      },
+      cancelOnError: true,
+    );
+  }
+
   void _startPolling() {
     // Cancel any existing timer
     _pollTimer?.cancel();
@@ -104,6 +104,38 @@ class ApiService {
     }
   }
 
+  /// Watch an analysis via Server-Sent Events until it completes or fails
+  Stream<AnalysisResult> watchAnalysis(String analysisId) async* {
+    try {
+      final response = await _dio.get<ResponseBody>(
+        '/api/analysis/$analysisId/events',
+        options: Options(
+          responseType: ResponseType.stream,
+          receiveTimeout: 0, // keep the stream open
+          headers: {'Accept': 'text/event-stream'},
+        ),
+      );
+
+      final lines = response.data!.stream
+          .cast<List<int>>()
+          .transform(utf8.decoder)
+          .transform(const LineSplitter());
+
+      await for (final line in lines) {
+        if (!line.startsWith('data:')) continue;
+        final result = AnalysisResult.fromJson(
+          jsonDecode(line.substring(5).trim()),
+        );
+        yield result;
+        if (result.status == 'completed' || result.status == 'error') {
+          break;
+        }
+      }
+    } on DioError catch (e) {
+      throw _handleDioError(e);
+    }
+  }
+
   /// Get user history
   Future<UserHistoryResponse> getUserHistory(
     String userId, {
@@ -0,0 +1,137 @@
+"""
+Persistent TTL + LRU cache for SerpAPI search results
+
+Shared by the CLI (smart_price_checker.py) and the FastAPI service, so
+both come up warm after a restart.
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, List, Optional
+
+# Zero-width characters that often sneak into Thai text
+_INVISIBLE = re.compile("[\u200b\u200c\u200d\u2060\ufeff]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so equivalent spellings share a cache key"""
+
+    text = unicodedata.normalize("NFC", query)
+    text = _INVISIBLE.sub("", text)
+    # NIKHAHIT + SARA AA is a common mis-typing of SARA AM
+    text = text.replace("\u0e4d\u0e32", "\u0e33")
+    text = _WHITESPACE.sub(" ", text).strip()
+    return text.casefold()
+
+
+class SearchCache:
+    """Size-bounded LRU cache with per-entry TTL, persisted to SQLite"""
+
+    def __init__(self, path: str = "data/search_cache.db", max_entries: int = 5000, ttl: float = 6 * 3600):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            "key TEXT PRIMARY KEY, results TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        """Warm the in-memory LRU with the newest unexpired entries"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM search_cache WHERE expires_at <= ?", (now,))
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT key, results, expires_at FROM search_cache "
+                "ORDER BY stored_at DESC LIMIT ?",
+                (self.max_entries,),
+            ).fetchall()
+            for key, results, expires_at in reversed(rows):
+                self._entries[key] = (expires_at, json.loads(results))
+
+    def get(self, query: str) -> Optional[List[Any]]:
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, results = entry
+            if expires_at <= time.time():
+                self._delete(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return results
+
+    def put(self, query: str, results: List[Any]):
+        key = normalize_query(query)
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, results)
+            self._entries.move_to_end(key)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, results, expires_at, stored_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(results), expires_at, now),
+            )
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._delete(oldest)
+            self._conn.commit()
+
+    def _delete(self, key: str):
+        self._entries.pop(key, None)
+        self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_search_cache = None
+_search_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> Optional[SearchCache]:
+    """Process-wide cache configured from SEARCH_CACHE_* environment variables"""
+
+    global _search_cache
+    if os.environ.get("SEARCH_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    with _search_cache_lock:
+        if _search_cache is None:
+            _search_cache = SearchCache(
+                path=os.environ.get("SEARCH_CACHE_PATH", "data/search_cache.db"),
+                max_entries=int(os.environ.get("SEARCH_CACHE_SIZE", "5000")),
+                ttl=float(os.environ.get("SEARCH_CACHE_TTL", str(6 * 3600))),
+            )
+        return _search_cache
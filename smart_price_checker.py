@@ -20,9 +20,29 @@ def get_image_input_from_user():
             sys.exit(1)
 
 import os
+import json
+import time
 from serpapi import GoogleSearch
+from search_cache import get_search_cache
+from upstream_replay import get_upstream_archive, serpapi_key
 
 def perform_serpapi_search(query):
+    search_cache = get_search_cache()
+    if search_cache is not None:
+        cached = search_cache.get(query)
+        if cached is not None:
+            return cached
+
+    archive = get_upstream_archive()
+    if archive is not None and archive.mode == "replay":
+        entry = archive.lookup("serpapi", serpapi_key({"engine": "google", "q": query}))
+        if entry is None:
+            print(f"Error: no recorded SerpAPI response for: {query}")
+            return []
+        _, body, latency = entry
+        time.sleep(archive.replay_delay(latency))
+        return json.loads(body).get("organic_results", [])
+
     SERPAPI_API_KEY = os.environ.get("SERPAPI_API_KEY")
     if not SERPAPI_API_KEY:
         print("Error: SERPAPI_API_KEY environment variable not set.")
@@ -35,9 +55,14 @@ def perform_serpapi_search(query):
     }
 
     try:
+        started = time.perf_counter()
         search = GoogleSearch(params)
         results = search.get_dict()
+        if archive is not None and archive.mode == "record" and "error" not in results:
+            archive.store("serpapi", serpapi_key(params), 200, json.dumps(results).encode(), time.perf_counter() - started)
         organic_results = results.get("organic_results", [])
+        if search_cache is not None and "error" not in results:
+            search_cache.put(query, organic_results)
         return organic_results
     except Exception as e:
         print(f"Error performing SerpAPI search: {e}")
@@ -1,26 +1,61 @@
 #!/usr/bin/env python3
 """
 Startup script for the 2nd Hand Price Checker FastAPI backend
+
+Development (default): one process with auto-reload.
+Production (--production or APP_ENV=production): worker processes on
+one shared socket, uvloop and httptools when installed, and dependencies
+preloaded once in the parent so workers fork warm and share those pages.
+More than one worker requires ANALYSIS_EXECUTOR=durable, so analyses,
+their events and deletions are visible to every worker.
+
+Usage: python start_backend.py [--production] [--workers 4] [--port 8000]
 """
 
+import argparse
+import importlib
 import os
+import signal
+import socket
 import sys
+import time
 from pathlib import Path
 
 # Add the current directory to Python path
 sys.path.insert(0, str(Path(__file__).parent))
 
-def main():
-    """Start the FastAPI server"""
-    
+APP = "api.main:app"
+
+# Imported by the parent before forking. api.main itself is imported in
+# each worker: it opens SQLite connections and starts the log writer
+# thread, neither of which survives a fork.
+PRELOAD_MODULES = [
+    "fastapi",
+    "pydantic",
+    "starlette.responses",
+    "httpx",
+    "numpy",
+    "PIL.Image",
+    "api.models",
+    "api.services.analysis_service",
+    "api.services.analysis_store",
+    "api.services.job_queue",
+    "api.services.durable_queue",
+    "api.services.metrics",
+]
+
+
+def check_environment():
+    """Warn about missing API keys"""
+
     # Check for required environment variables
     required_env_vars = ['ARK_API_KEY', 'SERPAPI_API_KEY']
     missing_vars = []
-    
+
     for var in required_env_vars:
         if not os.getenv(var):
             missing_vars.append(var)
-    
+
     if missing_vars:
         print("Warning: Missing environment variables:")
         for var in missing_vars:
@@ -30,34 +65,166 @@ def main():
         print("   export ARK_API_KEY='your_ark_api_key'")
         print("   export SERPAPI_API_KEY='your_serpapi_key'")
         print()
-    
+
+
+def _available(module: str) -> bool:
+    try:
+        importlib.import_module(module)
+        return True
+    except ImportError:
+        return False
+
+
+def preload():
+    """Import the app's dependencies so forked workers start warm"""
+
+    started = time.perf_counter()
+    for module in PRELOAD_MODULES:
+        importlib.import_module(module)
+    print(f"Preloaded {len(PRELOAD_MODULES)} modules in {time.perf_counter() - started:.2f}s")
+
+
+def run_worker(sock: socket.socket, loop: str, http: str, log_level: str):
+    """Serve the app on an inherited socket until told to stop"""
+
+    import uvicorn
+
+    # Uvicorn installs its own handlers for a graceful shutdown
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    config = uvicorn.Config(APP, loop=loop, http=http, log_level=log_level, access_log=False)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def serve_production(host: str, port: int, workers: int, loop: str, http: str, log_level: str, preload_app: bool):
+    """Fork ``workers`` uvicorn processes sharing one listening socket, restarting any that die"""
+
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    if preload_app:
+        preload()
+
+    children = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                run_worker(sock, loop, http, log_level)
+                code = 0
+            finally:
+                os._exit(code)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for _ in range(workers):
+        spawn()
+    print(f"Started {workers} workers (pid {os.getpid()}): {', '.join(str(pid) for pid in children)}")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if stopping or started is None:
+            continue
+        print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+        # Don't spin if workers die straight away (e.g. a broken import)
+        if time.monotonic() - started < 1.0:
+            time.sleep(1.0)
+        spawn()
+
+    sock.close()
+
+
+def main():
+    """Start the FastAPI server"""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--production", action="store_true",
+                        default=os.environ.get("APP_ENV", "development").lower() == "production")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=None,
+                        help="default WEB_CONCURRENCY, else one per CPU with ANALYSIS_EXECUTOR=durable and 1 otherwise")
+    parser.add_argument("--loop", default=os.environ.get("UVICORN_LOOP", "auto"), choices=["auto", "asyncio", "uvloop"])
+    parser.add_argument("--http", default=os.environ.get("UVICORN_HTTP", "auto"), choices=["auto", "h11", "httptools"])
+    parser.add_argument("--no-preload", dest="preload", action="store_false",
+                        default=os.environ.get("PRELOAD_APP", "true").lower() == "true")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    durable = os.environ.get("ANALYSIS_EXECUTOR", "inprocess").lower() == "durable"
+    if args.workers is None:
+        args.workers = int(os.environ.get("WEB_CONCURRENCY", str(os.cpu_count() or 1) if durable else "1"))
+
+    check_environment()
+
     # Import and run the FastAPI app
     try:
         import uvicorn
-        from api.main import app
-        
+
         print("Starting 2nd Hand Price Checker API...")
-        print("Server will be available at: http://localhost:8000")
-        print("API documentation: http://localhost:8000/docs")
-        print("\nStarting server...")
-        
-        uvicorn.run(
-            app,
-            host="0.0.0.0",
-            port=8000,
-            reload=True,
-            log_level="info"
-        )
-        
+        print(f"Server will be available at: http://localhost:{args.port}")
+        print(f"API documentation: http://localhost:{args.port}/docs")
+
+        if not args.production:
+            print("\nStarting development server...")
+            uvicorn.run(APP, host=args.host, port=args.port, reload=True, log_level=args.log_level)
+            return
+
+        loop = args.loop if args.loop != "auto" else ("uvloop" if _available("uvloop") else "asyncio")
+        http = args.http if args.http != "auto" else ("httptools" if _available("httptools") else "h11")
+        print(f"\nStarting production server: {args.workers} workers, loop={loop}, http={http}")
+
+        if args.workers > 1:
+            if os.environ.get("ANALYSIS_STORE", "sqlite").lower() == "memory":
+                print("Error: ANALYSIS_STORE=memory can't be shared between workers; use sqlite or --workers 1")
+                sys.exit(1)
+            if not durable:
+                # In-process analyses, their events and cache invalidations
+                # never reach the other workers
+                print("Error: several workers need ANALYSIS_EXECUTOR=durable (and worker.py processes);")
+                print("   use --workers 1 for the in-process executor.")
+                sys.exit(1)
+
+        if not hasattr(os, "fork"):
+            # No fork (Windows): uvicorn's own supervisor, workers import everything themselves
+            uvicorn.run(APP, host=args.host, port=args.port, workers=args.workers,
+                        loop=loop, http=http, log_level=args.log_level, access_log=False)
+            return
+
+        serve_production(args.host, args.port, args.workers, loop, http, args.log_level, args.preload)
+
     except ImportError as e:
         print(f"Error importing required modules: {e}")
         print("\nPlease install the required dependencies:")
         print("   pip install -r requirements.txt")
         sys.exit(1)
-    
+
     except Exception as e:
         print(f"Error starting server: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
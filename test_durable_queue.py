@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Test that the durable queue's change sequence survives purging finished jobs
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the current directory to Python path
+sys.path.append(str(Path(__file__).parent))
+
+from api.services.durable_queue import DurableJobQueue
+
+
+def test_purge_keeps_sequence():
+    with tempfile.TemporaryDirectory() as workdir:
+        queue = DurableJobQueue(str(Path(workdir) / "jobs.db"))
+        queue.enqueue("first", {})
+        job = queue.claim("worker")
+        assert queue.complete(job["job_id"], "worker", {"ok": True})
+
+        # What an API collector has seen so far
+        last_seq = queue.last_seq()
+        assert last_seq == 3
+
+        time.sleep(0.01)
+        assert queue.purge_finished(older_than=0) == 1
+        queue.enqueue("second", {})
+
+        changes = queue.changes_since(last_seq)
+        assert [(change["job_id"], change["status"]) for change in changes] == [("second", "queued")]
+        assert changes[0]["seq"] > last_seq
+        queue.close()
+
+        # Reopening continues the same sequence
+        reopened = DurableJobQueue(str(Path(workdir) / "jobs.db"))
+        assert reopened.last_seq() == changes[0]["seq"]
+        reopened.close()
+
+
+if __name__ == "__main__":
+    test_purge_keeps_sequence()
+    print("✅ Purging finished jobs keeps the change sequence")
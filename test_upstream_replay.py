@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test that upstream exchanges recorded through a gzip-encoding server replay intact
+"""
+
+import asyncio
+import gzip
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+import httpx
+
+# Add the current directory to Python path
+sys.path.append(str(Path(__file__).parent))
+
+from upstream_replay import RecordReplayTransport, UpstreamArchive
+
+SEARCH_RESULT = {"organic_results": [{"title": "iPhone 12 Pro มือสอง", "snippet": "ราคา 15,900 บาท"}]}
+
+
+class GzipUpstream(httpx.AsyncBaseTransport):
+    """Answers every request with a gzip-encoded JSON body, like SerpAPI and Ark do"""
+
+    def __init__(self):
+        self.requests = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        body = gzip.compress(json.dumps(SEARCH_RESULT).encode())
+        return httpx.Response(
+            200,
+            headers={"Content-Type": "application/json", "Content-Encoding": "gzip", "Content-Length": str(len(body))},
+            content=body,
+        )
+
+
+async def record_then_replay(archive_path: str):
+    upstream = GzipUpstream()
+    params = {"engine": "google", "q": "iPhone 12 Pro ราคา"}
+
+    archive = UpstreamArchive(archive_path, mode="record")
+    transport = RecordReplayTransport(archive, upstream)
+    async with httpx.AsyncClient(transport=transport, base_url="https://serpapi.test") as client:
+        recorded = await client.get("/search.json", params=params)
+    assert recorded.json() == SEARCH_RESULT
+    assert archive.recorded == 1
+
+    archive.mode = "replay"
+    async with httpx.AsyncClient(transport=transport, base_url="https://serpapi.test") as client:
+        replayed = await client.get("/search.json", params=params)
+    assert replayed.json() == SEARCH_RESULT
+    assert upstream.requests == 1
+    assert archive.hits == 1
+
+
+def test_record_then_replay_gzip():
+    with tempfile.TemporaryDirectory() as workdir:
+        asyncio.run(record_then_replay(str(Path(workdir) / "archive.db")))
+
+
+if __name__ == "__main__":
+    test_record_then_replay_gzip()
+    print("✅ Record/replay through a gzip upstream works")
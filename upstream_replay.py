@@ -0,0 +1,217 @@
+"""
+Record/replay archive for SerpAPI and Ark calls
+
+UPSTREAM_MODE=record stores every successful upstream exchange with its
+latency; UPSTREAM_MODE=replay serves them back without the network,
+sleeping for the recorded latency times REPLAY_LATENCY_SCALE. Requests
+are keyed on a normalized form (normalized query for searches, a hash of
+the request body with image data replaced by its digest for chat
+completions), so equivalent requests hit the same entry.
+
+Shared by the CLI (smart_price_checker.py) and the FastAPI service.
+
+Usage: python upstream_replay.py [archive.db]   # print archive contents
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from search_cache import normalize_query
+
+MODES = ("live", "record", "replay")
+
+# Request parameters that don't change the answer
+_IGNORED_PARAMS = {"api_key", "output", "no_cache"}
+
+# Describe the encoded body on the wire, not the decoded one we pass on
+_WIRE_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+def serpapi_key(params: Dict[str, Any]) -> str:
+    """Archive key for a SerpAPI search"""
+    normalized = {
+        name: normalize_query(str(value)) if name == "q" else str(value)
+        for name, value in params.items()
+        if name not in _IGNORED_PARAMS
+    }
+    normalized.setdefault("engine", "google")
+    return json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+
+
+def _strip_data_urls(value: Any) -> Any:
+    """Replace inline images by their digest so keys stay small"""
+    if isinstance(value, dict):
+        return {key: _strip_data_urls(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_strip_data_urls(item) for item in value]
+    if isinstance(value, str) and value.startswith("data:"):
+        return "sha256:" + hashlib.sha256(value.encode()).hexdigest()
+    return value
+
+
+def chat_key(body: Dict[str, Any]) -> str:
+    """Archive key for a chat completion request"""
+    canonical = json.dumps(_strip_data_urls(body), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class UpstreamArchive:
+    """Indexed SQLite archive of upstream responses, zlib-compressed"""
+
+    def __init__(self, path: str = "data/upstream_archive.db", mode: str = "record", latency_scale: float = 1.0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown upstream mode: {mode}")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.mode = mode
+        self.latency_scale = latency_scale
+
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS exchanges ("
+            "service TEXT NOT NULL, key TEXT NOT NULL, status INTEGER NOT NULL, "
+            "body BLOB NOT NULL, latency REAL NOT NULL, recorded_at REAL NOT NULL, "
+            "PRIMARY KEY (service, key))"
+        )
+        self._conn.commit()
+
+    def lookup(self, service: str, key: str) -> Optional[Tuple[int, bytes, float]]:
+        """(status, body, latency) of a recorded exchange"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, body, latency FROM exchanges WHERE service = ? AND key = ?",
+                (service, key),
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        status, body, latency = row
+        return status, zlib.decompress(body), latency
+
+    def store(self, service: str, key: str, status: int, body: bytes, latency: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO exchanges (service, key, status, body, latency, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (service, key, status, zlib.compress(body, 6), latency, time.time()),
+            )
+            self._conn.commit()
+        self.recorded += 1
+
+    def replay_delay(self, latency: float) -> float:
+        return latency * self.latency_scale
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT service, COUNT(*), SUM(LENGTH(body)), AVG(latency) FROM exchanges GROUP BY service"
+            ).fetchall()
+        return {
+            service: {"exchanges": count, "compressed_bytes": size, "avg_latency": round(latency, 3)}
+            for service, count, size, latency in rows
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses, "recorded": self.recorded}
+
+
+class RecordReplayTransport(httpx.AsyncBaseTransport):
+    """httpx transport that records or replays SerpAPI and Ark exchanges
+
+    Anything it doesn't recognise passes straight through. A replay miss
+    answers 404 so callers take their normal error path, with no network.
+    """
+
+    def __init__(self, archive: UpstreamArchive, inner: Optional[httpx.AsyncBaseTransport] = None):
+        self.archive = archive
+        self.inner = inner or httpx.AsyncHTTPTransport()
+
+    @staticmethod
+    def _identify(request: httpx.Request) -> Optional[Tuple[str, str]]:
+        path = request.url.path
+        if path.endswith("/search.json"):
+            return "serpapi", serpapi_key(dict(request.url.params))
+        if path.endswith("/chat/completions"):
+            return "ark", chat_key(json.loads(request.content or b"{}"))
+        return None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        identity = self._identify(request)
+        if identity is None or self.archive.mode == "live":
+            return await self.inner.handle_async_request(request)
+        service, key = identity
+
+        if self.archive.mode == "replay":
+            entry = await asyncio.to_thread(self.archive.lookup, service, key)
+            if entry is None:
+                return httpx.Response(404, json={"error": f"No recorded {service} response"}, request=request)
+            status, body, latency = entry
+            await asyncio.sleep(self.archive.replay_delay(latency))
+            return httpx.Response(status, content=body, headers={"Content-Type": "application/json"}, request=request)
+
+        started = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        body = await response.aread()
+        latency = time.perf_counter() - started
+        # Only successes are worth replaying; transient failures are not part of the workload
+        if response.status_code < 400:
+            await asyncio.to_thread(self.archive.store, service, key, response.status_code, body, latency)
+        # aread() already decoded the body; the framing headers describe the wire form
+        headers = [
+            (name, value) for name, value in response.headers.multi_items()
+            if name.lower() not in _WIRE_HEADERS
+        ]
+        return httpx.Response(
+            response.status_code, headers=headers, content=body, request=request,
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_upstream_archive() -> Optional[UpstreamArchive]:
+    """Process-wide archive configured from UPSTREAM_* variables, None in live mode"""
+
+    global _archive
+    mode = os.environ.get("UPSTREAM_MODE", "live").lower()
+    if mode == "live":
+        return None
+    with _archive_lock:
+        if _archive is None:
+            _archive = UpstreamArchive(
+                path=os.environ.get("UPSTREAM_ARCHIVE_PATH", "data/upstream_archive.db"),
+                mode=mode,
+                latency_scale=float(os.environ.get("REPLAY_LATENCY_SCALE", "1.0")),
+            )
+        return _archive
+
+
+if __name__ == "__main__":
+    archive_path = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("UPSTREAM_ARCHIVE_PATH", "data/upstream_archive.db")
+    if not Path(archive_path).exists():
+        print(f"No archive at {archive_path}")
+        sys.exit(1)
+    print(json.dumps(UpstreamArchive(archive_path, mode="replay").summary(), indent=2))
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Out-of-process analysis workers for the 2nd Hand Price Checker
+
+Each worker process pulls jobs from the durable SQLite queue that the
+API writes to when started with ANALYSIS_EXECUTOR=durable, runs
+AnalysisService and writes the result back to the queue. Run as many
+workers as you have cores, on any machine that shares the queue file
+and the uploads directory.
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+import uuid
+from pathlib import Path
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+logger = logging.getLogger("worker")
+
+
+async def run_worker(db_path: str, worker_id: str, visibility_timeout: float, poll_interval: float):
+    """Claim and process jobs until the process is stopped"""
+
+    from api.services.analysis_service import AnalysisService
+    from api.services.durable_queue import DurableJobQueue
+    from api.services.structured_logging import analysis_id_var
+
+    queue = DurableJobQueue(db_path)
+    service = AnalysisService()
+    logger.info("Worker %s started", worker_id)
+
+    while True:
+        job = await asyncio.to_thread(queue.claim, worker_id, visibility_timeout)
+        if job is None:
+            await asyncio.sleep(poll_interval)
+            continue
+
+        job_id = job["job_id"]
+        analysis_id_var.set(job_id)
+        try:
+            result = await asyncio.wait_for(
+                service.analyze_images(job["payload"]["image_paths"], job["payload"].get("image_hashes")),
+                timeout=visibility_timeout,
+            )
+        except Exception as e:
+            # Exponential backoff between attempts
+            retry_delay = min(60, 2 ** job["attempt"])
+            logger.warning("Worker %s: attempt %d failed: %s", worker_id, job["attempt"], e)
+            await asyncio.to_thread(queue.fail, job_id, worker_id, str(e) or type(e).__name__, retry_delay)
+            continue
+
+        if not await asyncio.to_thread(queue.complete, job_id, worker_id, result):
+            logger.warning("Worker %s: lease expired, result dropped", worker_id)
+
+
+def worker_main(db_path: str, visibility_timeout: float, poll_interval: float):
+    from api.services.structured_logging import setup_logging
+
+    setup_logging()
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    try:
+        asyncio.run(run_worker(db_path, worker_id, visibility_timeout, poll_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    """Start a pool of worker processes"""
+
+    parser = argparse.ArgumentParser(description="Run analysis workers")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument("--db", default=os.environ.get("ANALYSIS_QUEUE_PATH", "data/jobs.db"),
+                        help="path of the durable queue database")
+    parser.add_argument("--visibility-timeout", type=float, default=120,
+                        help="seconds a claimed job stays invisible to other workers")
+    parser.add_argument("--poll-interval", type=float, default=0.5,
+                        help="seconds to sleep when the queue is empty")
+    args = parser.parse_args()
+
+    print(f"Starting {args.processes} analysis worker(s) on {args.db}")
+    processes = [
+        multiprocessing.Process(
+            target=worker_main,
+            args=(args.db, args.visibility_timeout, args.poll_interval),
+            daemon=True,
+        )
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    def shutdown(signum, frame):
+        print("\nStopping workers...")
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    try:
+        while any(process.is_alive() for process in processes):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        shutdown(None, None)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()